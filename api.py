@@ -0,0 +1,515 @@
+import os
+import json
+import asyncio
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Request, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
+import uvicorn
+
+import tuning
+tuning.load_profile()
+
+import bucketing
+import live
+import metrics
+import model
+import policy
+from batching import MicroBatcher, QueueFullError
+from breakdown import breakdown_documents
+from cache import PredictionCache
+from examples import sample_texts
+from registry import SHADOW_THREADS, ModelRegistry
+from workers import ProcessPool
+
+# ==================== PARTIE 1 : BACKEND FASTAPI ====================
+
+# Réglages du micro-batching (latence p50 contre débit)
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "5"))
+# Exécuteur d'inférence borné : nombre de workers, profondeur de file
+# (en textes) et threads torch par worker (0 = cœurs / workers)
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "1"))
+INFERENCE_QUEUE_DEPTH = int(os.environ.get("INFERENCE_QUEUE_DEPTH", "256"))
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", "0"))
+# Threads torch inter-op (0 = défaut de torch), voir `cli.py autotune`
+INFERENCE_INTEROP_THREADS = int(os.environ.get("INFERENCE_INTEROP_THREADS", "0"))
+RETRY_AFTER_SECONDS = int(os.environ.get("RETRY_AFTER_SECONDS", "1"))
+# Processus d'inférence partageant les poids (0 = threads dans ce processus)
+INFERENCE_PROCESSES = int(os.environ.get("INFERENCE_PROCESSES", "0"))
+# Taille des paquets envoyés au modèle par /predict_batch
+BATCH_CHUNK_SIZE = int(os.environ.get("BATCH_CHUNK_SIZE", "64"))
+# Corps NDJSON de /predict_batch gardé en mémoire jusqu'à cette taille, sur disque au-delà
+NDJSON_SPOOL_MAX_BYTES = int(os.environ.get("NDJSON_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+# Cache des prédictions (CACHE_SIZE=0 désactive le niveau mémoire,
+# CACHE_PATH active le niveau SQLite persistant)
+CACHE_SIZE = int(os.environ.get("CACHE_SIZE", "10000"))
+CACHE_PATH = os.environ.get("CACHE_PATH") or None
+# Tailles de lots jouées au préchauffage (par défaut celles configurées ci-dessus)
+WARMUP_BATCH_SIZES = [
+    int(size) for size in
+    os.environ.get("WARMUP_BATCH_SIZES", f"1,{BATCH_MAX_SIZE},{BATCH_CHUNK_SIZE}").split(",")
+    if size.strip() and int(size) > 0
+]
+WARMUP_ROUNDS = int(os.environ.get("WARMUP_ROUNDS", "1"))
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Démarrage d'uvicorn : le modèle est chargé en arrière-plan (voir
+# start_model_loading). Arrêt : les prédictions pas encore écrites sur disque
+# le sont, puis les workers d'inférence s'arrêtent.
+@asynccontextmanager
+async def lifespan(app):
+    start_model_loading()
+    yield
+    await run_in_threadpool(shutdown)
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"], 
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Le pool de processus est créé par prepare_model(), une fois le modèle chargé
+pool = None
+inference_workers = INFERENCE_PROCESSES if INFERENCE_PROCESSES > 0 else INFERENCE_WORKERS
+# Modèle servi (pool ou pipeline) et clé du cache, changés ensemble par activate_model()
+_serving_lock = threading.Lock()
+
+# Les prédictions sont mises en cache sous la clé du modèle qui les a
+# calculées, même si un autre modèle est activé pendant le calcul
+def run_inference(texts):
+    metrics.BATCH_SIZE.observe(len(texts))
+    with _serving_lock:
+        serving_pool, pipe, model_id = pool, model.classifier, cache.model_id
+    start = time.perf_counter()
+    if serving_pool is not None:
+        predictions = serving_pool.classify_texts(texts)
+    else:
+        predictions = model.classify_texts(texts, pipe=pipe)
+    registry.mirror(texts, predictions, time.perf_counter() - start)
+    cache.put_many(texts, predictions, model_id=model_id)
+    return predictions
+
+# Un lot envoyé à chaque worker, en parallèle, pour que chaque processus soit préchauffé
+def warm_inference(texts):
+    if pool is None:
+        return model.classify_texts(texts)
+    return [future.result() for future in pool.submit_each(texts)][0]
+
+# Démarrage en phases, hors de la boucle d'événements : le port est ouvert
+# tout de suite, /readyz ne répond 200 qu'une fois le modèle chargé et préchauffé
+def prepare_model():
+    global pool
+    try:
+        model.load_model()
+        if INFERENCE_PROCESSES > 0:
+            # Fork après chargement : les workers partagent les poids. Le parent
+            # n'a encore fait aucune inférence (pas de pool de threads torch actif).
+            with model.startup_phase("workers"):
+                pool = ProcessPool(
+                    INFERENCE_PROCESSES, threads=INFERENCE_THREADS or None,
+                    interop_threads=INFERENCE_INTEROP_THREADS or None
+                )
+        else:
+            model.set_torch_threads(INFERENCE_WORKERS, INFERENCE_THREADS or None, INFERENCE_INTEROP_THREADS or None)
+        model.warm_up(warm_inference, WARMUP_BATCH_SIZES, rounds=WARMUP_ROUNDS)
+        registry.register_active(
+            model.MODEL_NAME, model.MODEL_BACKEND, model.status["load_seconds"], model.status["warmup_seconds"]
+        )
+        model.mark_ready()
+    except Exception as e:
+        model.mark_failed(e)
+
+# Clé du cache : modèle servi, politique de décision et réglages d'inférence
+def cache_id():
+    return f"{model.MODEL_ID}|{policy.POLICY_ID}|{model.inference_config_id()}"
+
+# Changement de modèle à chaud (voir registry.py). En mode processus, un
+# nouveau pool est forké avec les nouveaux poids et préchauffé avant la
+# bascule ; l'ancien s'arrête une fois ses derniers lots rendus.
+def activate_model(pipe, name, backend):
+    global pool
+    previous = replacement = None
+    if INFERENCE_PROCESSES > 0:
+        # Le processus principal ne fait pas d'inférence : les nouveaux
+        # poids y sont installés avant le fork des workers qui les servent
+        model.activate(pipe, name, backend)
+        replacement = ProcessPool(
+            INFERENCE_PROCESSES, threads=INFERENCE_THREADS or None,
+            interop_threads=INFERENCE_INTEROP_THREADS or None
+        )
+        texts = sample_texts()
+        for size in WARMUP_BATCH_SIZES:
+            batch = [texts[i % len(texts)] for i in range(size)]
+            for future in replacement.submit_each(batch):
+                future.result()
+    with _serving_lock:
+        if replacement is None:
+            model.activate(pipe, name, backend)
+        else:
+            previous, pool = pool, replacement
+        cache.model_id = cache_id()
+    if previous is not None:
+        threading.Thread(target=previous.retire, daemon=True, name="pool-retire").start()
+
+# Pool d'un seul worker pour le candidat en shadow (mode processus)
+def start_shadow_pool(pipe):
+    return ProcessPool(1, threads=SHADOW_THREADS, pipe=pipe)
+
+registry = ModelRegistry(
+    activate_model,
+    warm_batch_sizes=WARMUP_BATCH_SIZES,
+    shadow_pool=start_shadow_pool if INFERENCE_PROCESSES > 0 else None
+)
+
+_loading_started = threading.Event()
+_loading_lock = threading.Lock()
+
+# Appelé au démarrage d'uvicorn, ou par l'interface en mode local ; sans effet la seconde fois
+def start_model_loading():
+    with _loading_lock:
+        if _loading_started.is_set():
+            return
+        _loading_started.set()
+    threading.Thread(target=prepare_model, daemon=True, name="model-loader").start()
+
+# Un thread du batcher par worker : chaque processus reçoit ses propres lots
+batcher = MicroBatcher(
+    run_inference,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    workers=inference_workers,
+    max_queue=INFERENCE_QUEUE_DEPTH
+)
+
+cache = PredictionCache(cache_id(), max_size=CACHE_SIZE, path=CACHE_PATH)
+
+def shutdown():
+    cache.flush()
+    if pool is not None:
+        pool.close()
+
+# Seuls les textes absents du cache passent par le modèle (qui les y ajoute,
+# voir run_inference). Appel bloquant (traitement en masse) : attend une place
+# dans la file.
+def classify_with_cache(texts):
+    predictions = cache.get_many(texts)
+    missing = [i for i, prediction in enumerate(predictions) if prediction is None]
+    if missing:
+        computed = batcher.submit_many([texts[i] for i in missing]).result()
+        for i, prediction in zip(missing, computed):
+            predictions[i] = prediction
+    return predictions
+
+# Métriques lues à l'export de /metrics
+for name, help, read, kind in (
+    ("sentiment_queue_depth", "Textes en attente ou en cours dans l'exécuteur", lambda: batcher.pending, "gauge"),
+    ("sentiment_model_ready", "1 si le modèle est chargé et préchauffé", lambda: int(model.is_ready()), "gauge"),
+    ("sentiment_model_load_seconds", "Durée du chargement du modèle", lambda: model.status["load_seconds"], "gauge"),
+    ("sentiment_model_warmup_seconds", "Durée du préchauffage", lambda: model.status["warmup_seconds"], "gauge"),
+    ("sentiment_padding_efficiency", "Tokens réels / tokens calculés",
+     lambda: bucketing.padding_stats.report()["padding_efficiency"], "gauge"),
+    ("sentiment_cache_hits_total", "Prédictions servies par le cache", lambda: cache.hits, "counter"),
+    ("sentiment_cache_misses_total", "Prédictions absentes du cache", lambda: cache.misses, "counter"),
+    ("sentiment_cache_evictions_total", "Entrées évincées du cache mémoire", lambda: cache.evictions, "counter"),
+    ("sentiment_token_cache_hits_total", "Textes dont les tokens venaient du cache", lambda: model.token_cache.hits, "counter"),
+    ("sentiment_token_cache_misses_total", "Textes tokenisés", lambda: model.token_cache.misses, "counter"),
+):
+    metrics.registry.register(metrics.Gauge(name, help, read, kind=kind))
+
+class TextData(BaseModel):
+    text: str
+
+class BatchData(BaseModel):
+    texts: List[str]
+
+class BreakdownData(BaseModel):
+    texts: List[str]
+    language: Optional[str] = None
+
+# Modèle prêt et, en mode processus, au moins un worker d'inférence vivant
+def is_serving():
+    return model.is_ready() and (pool is None or pool.alive > 0)
+
+def unavailable_reason():
+    if model.is_ready():
+        return "aucun worker d'inférence en vie"
+    return f"Modèle indisponible ({model.status['phase']})"
+
+def not_ready_error():
+    return HTTPException(
+        status_code=503,
+        detail=unavailable_reason(),
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+    )
+
+def queue_full_error():
+    return HTTPException(
+        status_code=503,
+        detail="File d'inférence pleine, réessayez plus tard",
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+    )
+
+# Prédiction trouvée dans le cache, sinon future de l'exécuteur d'inférence.
+# Le cache peut répondre avant que le modèle soit prêt.
+def submit_text(text):
+    prediction = cache.get(text)
+    if prediction is not None:
+        return prediction, None
+    if not is_serving():
+        raise model.ModelNotReadyError(unavailable_reason())
+    return None, batcher.submit(text)
+
+# Version pour la boucle d'événements : une lecture du niveau SQLite du cache
+# passe par le pool de threads (les écritures, elles, sont différées)
+async def submit_text_async(text):
+    if cache.persistent:
+        return await run_in_threadpool(submit_text, text)
+    return submit_text(text)
+
+# L'inférence tourne sur l'exécuteur dédié : la boucle d'événements reste libre
+@app.post("/predict")
+async def predict_sentiment(data: TextData, request: Request):
+    metrics.observe_parse(request)
+    try:
+        prediction, future = await submit_text_async(data.text)
+    except model.ModelNotReadyError:
+        raise not_ready_error()
+    except QueueFullError:
+        raise queue_full_error()
+    if future is not None:
+        prediction = await asyncio.wrap_future(future)
+    with metrics.STAGE_LATENCY.time(stage="serialize"):
+        return JSONResponse({
+            "label": prediction['label'],
+            "score": prediction['score'],
+            "stars": prediction['stars'],
+            "probs": prediction['probs'],
+        })
+
+# Analyse en direct pendant la frappe : une connexion par client, voir live.py
+@app.websocket("/ws/predict")
+async def predict_live(websocket: WebSocket):
+    await websocket.accept()
+    await live.LiveSession(websocket, submit_text_async).run()
+
+# ---------- Registre des modèles ----------
+
+class ModelLoadData(BaseModel):
+    name: str
+    backend: str = "torch-fp32"
+    promote: bool = False
+    shadow_rate: Optional[float] = None
+
+class ShadowData(BaseModel):
+    rate: float
+
+@app.get("/models")
+def list_models():
+    return registry.report()
+
+# Chargement et préchauffage en arrière-plan : suivre l'avancement sur /models
+@app.post("/models/load", status_code=202)
+def load_candidate_model(data: ModelLoadData):
+    import backends
+    if data.backend not in backends.BACKENDS:
+        raise HTTPException(status_code=422, detail=f"Backend inconnu : {data.backend}")
+    try:
+        model_id = registry.load(data.name, data.backend, promote=data.promote, shadow_rate=data.shadow_rate)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"model": model_id, "phase": "loading"}
+
+@app.post("/models/promote")
+def promote_model():
+    if not is_serving():
+        raise not_ready_error()
+    try:
+        return {"active": registry.promote()}
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/models/shadow")
+def set_shadow_rate(data: ShadowData):
+    registry.set_shadow_rate(data.rate)
+    return registry.report()
+
+# Vivacité : le processus répond (500 seulement si le chargement a échoué)
+@app.get("/healthz")
+def healthz():
+    report = model.status_report()
+    if report["phase"] == "failed":
+        return JSONResponse(report, status_code=500)
+    return report
+
+# Disponibilité : modèle chargé et préchauffé, et en mode processus au moins un worker vivant
+@app.get("/readyz")
+def readyz():
+    report = model.status_report()
+    if pool is not None:
+        report["workers_alive"] = pool.alive
+    if not is_serving():
+        return JSONResponse(report, status_code=503, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    return report
+
+@app.get("/workers")
+def workers_health():
+    if INFERENCE_PROCESSES <= 0:
+        return {"mode": "threads", "workers": inference_workers, "pending": batcher.pending}
+    if pool is None:
+        return {"mode": "processes", "pending": batcher.pending, "alive": 0, "restarts": 0, "last_failure": None, "workers": []}
+    return {
+        "mode": "processes",
+        "pending": batcher.pending,
+        "alive": pool.alive,
+        "restarts": pool.restarts,
+        "last_failure": pool.last_failure,
+        "workers": pool.health(),
+    }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/inference/stats")
+def inference_stats():
+    return {
+        "padding": bucketing.padding_stats.report(),
+        "fast_path": model.INFERENCE_FAST_PATH,
+        "grad_mode": model.INFERENCE_GRAD_MODE,
+        "tuning_profile": tuning.applied,
+        "token_cache": model.token_cache.stats(),
+    }
+
+@app.get("/cache/stats")
+def cache_stats():
+    return cache.stats()
+
+# ---------- Prédiction en masse (/predict_batch) ----------
+
+# Le corps est lu en entier avant de commencer la réponse : une fois la
+# réponse partie, Starlette écoute la déconnexion du client sur le même
+# canal receive() et consommerait une partie du corps. Il est recopié dans
+# un fichier temporaire (en mémoire jusqu'à NDJSON_SPOOL_MAX_BYTES) pour ne
+# pas le garder en entier en mémoire.
+async def spool_body(request):
+    body = tempfile.SpooledTemporaryFile(max_size=NDJSON_SPOOL_MAX_BYTES)
+    try:
+        async for chunk in request.stream():
+            body.write(chunk)
+    except BaseException:
+        body.close()
+        raise
+    body.seek(0)
+    return body
+
+# Chaque ligne : {"text": "...", "id": ...} ou simplement "..."
+async def parse_ndjson_records(body):
+    index = 0
+    for line in body:
+        if not line.strip():
+            continue
+        record = {"index": index}
+        try:
+            value = json.loads(line)
+            if isinstance(value, dict):
+                if "id" in value:
+                    record["id"] = value["id"]
+                value = value.get("text")
+            if not isinstance(value, str):
+                raise ValueError("champ 'text' manquant ou invalide")
+            record["text"] = value
+        except ValueError as e:
+            record["error"] = str(e)
+        yield record
+        index += 1
+
+async def list_records(texts):
+    for index, text in enumerate(texts):
+        yield {"index": index, "text": text}
+
+def score_chunk(records):
+    valid = [record for record in records if "error" not in record]
+    predictions = iter(classify_with_cache([record["text"] for record in valid]) if valid else [])
+    lines = []
+    start = time.perf_counter()
+    for record in records:
+        line = {"index": record["index"]}
+        if "id" in record:
+            line["id"] = record["id"]
+        if "error" in record:
+            line["error"] = record["error"]
+        else:
+            line.update(next(predictions))
+        lines.append(json.dumps(line, ensure_ascii=False) + "\n")
+    metrics.STAGE_LATENCY.observe(time.perf_counter() - start, stage="serialize")
+    return lines
+
+# Envoie les résultats au fil de l'eau, paquet par paquet
+async def stream_predictions(records):
+    chunk = []
+    async for record in records:
+        chunk.append(record)
+        if len(chunk) >= BATCH_CHUNK_SIZE:
+            for line in await run_in_threadpool(score_chunk, chunk):
+                yield line
+            chunk = []
+    if chunk:
+        for line in await run_in_threadpool(score_chunk, chunk):
+            yield line
+
+@app.post("/predict_batch")
+async def predict_batch(request: Request):
+    if not is_serving():
+        raise not_ready_error()
+    metrics.observe_parse(request)
+    content_type = request.headers.get("content-type", "")
+    spooled = None
+    if content_type.startswith(NDJSON_MEDIA_TYPE):
+        spooled = await spool_body(request)
+        records = parse_ndjson_records(spooled)
+    else:
+        try:
+            body = await request.json()
+            if isinstance(body, list):
+                body = {"texts": body}
+            data = BatchData(**body)
+        except Exception:
+            raise HTTPException(
+                status_code=422,
+                detail='Attendu : {"texts": ["...", ...]} ou un corps NDJSON'
+            )
+        records = list_records(data.texts)
+    return StreamingResponse(
+        stream_predictions(records), media_type=NDJSON_MEDIA_TYPE,
+        background=BackgroundTask(spooled.close) if spooled is not None else None
+    )
+
+# ---------- Détail par phrase ----------
+
+# Phrases de tous les documents analysées ensemble, via le cache et l'exécuteur
+def breakdown(texts, language=None):
+    return breakdown_documents(texts, classify_with_cache, language, chunk_size=BATCH_CHUNK_SIZE)
+
+@app.post("/predict_breakdown")
+async def predict_breakdown(data: BreakdownData):
+    if not is_serving():
+        raise not_ready_error()
+    return await run_in_threadpool(breakdown, data.texts, data.language)
+
+# Fonction pour démarrer le serveur FastAPI en arrière-plan
+def run_fastapi():
+    uvicorn.run(app, host="127.0.0.1", port=8000, log_level="error")
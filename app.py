@@ -1,57 +1,18 @@
 import streamlit as st
+import html
+import os
+import tempfile
 import threading
-import time
-from fastapi import FastAPI
-from pydantic import BaseModel
-from transformers import pipeline
-from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
 from datetime import datetime
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 
-# ==================== PARTIE 1 : BACKEND FASTAPI ====================
+from client import SENTIMENT_API_URL, ServiceError, ServiceTimeout, ServiceUnavailable, ServiceUnreachable, make_client
+from examples import example_datasets
+from history import HistoryStore
 
-app = FastAPI()
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"], 
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Charger le modèle
-try:
-    classifier = pipeline(
-        "sentiment-analysis", 
-        model="nlptown/bert-base-multilingual-uncased-sentiment"
-    )
-    MODEL_READY = True
-except Exception as e:
-    print(f"Erreur modèle : {e}")
-    MODEL_READY = False
-
-class TextData(BaseModel):
-    text: str
-
-@app.post("/predict")
-def predict_sentiment(data: TextData):
-    if MODEL_READY:
-        result = classifier(data.text)[0]
-        star_value = int(result['label'].split()[0])
-        label = "POSITIVE" if star_value >= 4 else "NEGATIVE"
-        score = result['score']
-    else:
-        label = "POSITIVE"
-        score = 0.0
-    return {"label": label, "score": score}
-
-# Fonction pour démarrer le serveur FastAPI en arrière-plan
-def run_fastapi():
-    uvicorn.run(app, host="127.0.0.1", port=8000, log_level="error")
+# pandas et plotly (dashboard.py, uploads.py) ne sont importés que par les
+# pages qui s'en servent ; le modèle se charge en arrière-plan (voir api.py)
+# Le backend vit dans api.py : Streamlit ré-exécute ce script à chaque
+# interaction, alors qu'un module importé n'est chargé qu'une fois.
 
 # ==================== PARTIE 2 : FRONTEND STREAMLIT ====================
 
@@ -64,23 +25,38 @@ st.set_page_config(
 )
 
 # Initialisation de l'état de session
-if 'history' not in st.session_state:
-    st.session_state.history = []
 if 'language' not in st.session_state:
     st.session_state.language = 'fr'
 if 'current_text' not in st.session_state:
     st.session_state.current_text = ''
-if 'server_started' not in st.session_state:
-    st.session_state.server_started = False
 if 'current_page' not in st.session_state:
     st.session_state.current_page = 'Analyse'
 
-# Démarrer le serveur FastAPI une seule fois
-if not st.session_state.server_started:
+# Historique persistant, une seule instance pour toutes les sessions
+@st.cache_resource
+def get_history_store():
+    return HistoryStore()
+
+history_store = get_history_store()
+
+# Sans API distante, le serveur FastAPI local est démarré une seule fois par
+# processus (et non par session) pour les autres clients de l'API
+@st.cache_resource
+def start_local_api():
+    from api import run_fastapi
     thread = threading.Thread(target=run_fastapi, daemon=True)
     thread.start()
-    st.session_state.server_started = True
-    time.sleep(3)  # Attendre que le serveur démarre
+    return thread
+
+# Client d'inférence partagé : appels directs au modèle chargé dans ce
+# processus, ou client HTTP keep-alive vers SENTIMENT_API_URL
+@st.cache_resource
+def get_inference_client():
+    if not SENTIMENT_API_URL:
+        start_local_api()
+    return make_client()
+
+inference_client = get_inference_client()
 
 # Traductions
 translations = {
@@ -100,6 +76,8 @@ translations = {
         'error_server': '❌ Le serveur FastAPI a répondu avec une erreur. Veuillez réessayer.',
         'error_timeout': '⏱️ Délai d\'attente dépassé. Le serveur met trop de temps à répondre.',
         'error_connection': '🔌 Impossible de contacter l\'API. Patientez quelques secondes...',
+        'error_file': '❌ Fichier illisible : vérifiez son format et la colonne de texte.',
+        'model_loading': '⏳ Le modèle est en cours de chargement, réessayez dans quelques secondes.',
         'how_it_works': 'ℹ️ Comment ça fonctionne ?',
         'examples': '📚 Exemples de phrases',
         'history': '📜 Historique',
@@ -120,6 +98,18 @@ translations = {
         'recent_analyses': 'Analyses Récentes',
         'sentiment_by_time': 'Sentiments par Heure',
         'no_data': 'Aucune donnée disponible. Effectuez des analyses pour voir les statistiques.',
+        'date_range': '📅 Période',
+        'sentence_breakdown': '🔍 Détail par phrase',
+        'neutral': 'Sentiment Neutre',
+        'neutral_count': 'Analyses Neutres',
+        'decision_policy': '⚖️ Politique de décision',
+        'expected_thresholds': 'Seuils (étoiles attendues) : négatif ≤ … ≤ positif',
+        'file_analysis': '📂 Analyse de fichier',
+        'upload_label': 'Déposez un fichier CSV ou Parquet',
+        'text_column': 'Colonne contenant le texte',
+        'analyze_file_btn': '🚀 Analyser le fichier',
+        'rows_scored': 'lignes analysées',
+        'download_scored': '⬇️ Télécharger les résultats',
     },
     'en': {
         'title': '🎯 AI Sentiment Analyzer',
@@ -137,6 +127,8 @@ translations = {
         'error_server': '❌ The FastAPI server responded with an error. Please try again.',
         'error_timeout': '⏱️ Timeout exceeded. The server is taking too long to respond.',
         'error_connection': '🔌 Unable to contact the API. Wait a few seconds...',
+        'error_file': '❌ Unreadable file: check its format and the text column.',
+        'model_loading': '⏳ The model is still loading, please try again in a few seconds.',
         'how_it_works': 'ℹ️ How does it work?',
         'examples': '📚 Sample sentences',
         'history': '📜 History',
@@ -157,6 +149,18 @@ translations = {
         'recent_analyses': 'Recent Analyses',
         'sentiment_by_time': 'Sentiments by Hour',
         'no_data': 'No data available. Perform analyses to see statistics.',
+        'date_range': '📅 Time range',
+        'sentence_breakdown': '🔍 Sentence breakdown',
+        'neutral': 'Neutral Sentiment',
+        'neutral_count': 'Neutral Analyses',
+        'decision_policy': '⚖️ Decision policy',
+        'expected_thresholds': 'Thresholds (expected stars): negative ≤ … ≤ positive',
+        'file_analysis': '📂 File analysis',
+        'upload_label': 'Drop a CSV or Parquet file',
+        'text_column': 'Column containing the text',
+        'analyze_file_btn': '🚀 Analyze file',
+        'rows_scored': 'rows analyzed',
+        'download_scored': '⬇️ Download results',
     },
     'es': {
         'title': '🎯 Analizador de Sentimientos IA',
@@ -174,6 +178,8 @@ translations = {
         'error_server': '❌ El servidor FastAPI respondió con un error. Por favor intente nuevamente.',
         'error_timeout': '⏱️ Tiempo de espera excedido. El servidor está tardando demasiado en responder.',
         'error_connection': '🔌 No se puede contactar con la API. Espere unos segundos...',
+        'error_file': '❌ Archivo ilegible: verifique su formato y la columna de texto.',
+        'model_loading': '⏳ El modelo se está cargando, inténtelo de nuevo en unos segundos.',
         'how_it_works': 'ℹ️ ¿Cómo funciona?',
         'examples': '📚 Frases de ejemplo',
         'history': '📜 Historial',
@@ -194,6 +200,18 @@ translations = {
         'recent_analyses': 'Análisis Recientes',
         'sentiment_by_time': 'Sentimientos por Hora',
         'no_data': 'No hay datos disponibles. Realice análisis para ver estadísticas.',
+        'date_range': '📅 Periodo',
+        'sentence_breakdown': '🔍 Detalle por frase',
+        'neutral': 'Sentimiento Neutral',
+        'neutral_count': 'Análisis Neutrales',
+        'decision_policy': '⚖️ Política de decisión',
+        'expected_thresholds': 'Umbrales (estrellas esperadas): negativo ≤ … ≤ positivo',
+        'file_analysis': '📂 Análisis de archivo',
+        'upload_label': 'Suba un archivo CSV o Parquet',
+        'text_column': 'Columna con el texto',
+        'analyze_file_btn': '🚀 Analizar archivo',
+        'rows_scored': 'filas analizadas',
+        'download_scored': '⬇️ Descargar resultados',
     },
     'ar': {
         'title': '🎯 محلل المشاعر بالذكاء الاصطناعي',
@@ -211,6 +229,8 @@ translations = {
         'error_server': '❌ استجاب خادم FastAPI بخطأ. يرجى المحاولة مرة أخرى.',
         'error_timeout': '⏱️ انتهت المهلة الزمنية. الخادم يستغرق وقتًا طويلاً للرد.',
         'error_connection': '🔌 تعذر الاتصال بواجهة برمجة التطبيقات. انتظر بضع ثوان...',
+        'error_file': '❌ تعذرت قراءة الملف: تحقق من تنسيقه ومن عمود النص.',
+        'model_loading': '⏳ جارٍ تحميل النموذج، يرجى المحاولة مرة أخرى بعد بضع ثوان.',
         'how_it_works': 'ℹ️ كيف يعمل؟',
         'examples': '📚 أمثلة على الجمل',
         'history': '📜 السجل',
@@ -231,48 +251,70 @@ translations = {
         'recent_analyses': 'التحليلات الأخيرة',
         'sentiment_by_time': 'المشاعر حسب الساعة',
         'no_data': 'لا توجد بيانات متاحة. قم بإجراء تحليلات لرؤية الإحصائيات.',
+        'date_range': '📅 الفترة الزمنية',
+        'sentence_breakdown': '🔍 التحليل حسب الجملة',
+        'neutral': 'مشاعر محايدة',
+        'neutral_count': 'التحليلات المحايدة',
+        'decision_policy': '⚖️ سياسة القرار',
+        'expected_thresholds': 'العتبات (النجوم المتوقعة): سلبي ≤ … ≤ إيجابي',
+        'file_analysis': '📂 تحليل ملف',
+        'upload_label': 'أسقط ملف CSV أو Parquet',
+        'text_column': 'العمود الذي يحتوي على النص',
+        'analyze_file_btn': '🚀 تحليل الملف',
+        'rows_scored': 'سطر تم تحليله',
+        'download_scored': '⬇️ تنزيل النتائج',
     }
 }
 
-# Dataset d'exemples
-example_datasets = {
-    'fr': [
-        "J'adore cette application, elle est incroyable et très intuitive !",
-        "Le service client est excellent, j'ai reçu une aide rapide et efficace.",
-        "Quelle déception ! Le produit ne correspond pas du tout à la description.",
-        "Je suis très satisfait de mon achat, la qualité est au rendez-vous.",
-        "C'est horrible, je ne recommande absolument pas cette expérience.",
-        "Une expérience formidable ! Je reviendrai certainement.",
-    ],
-    'en': [
-        "I love this application, it's amazing and very intuitive!",
-        "The customer service is excellent, I received quick and efficient help.",
-        "What a disappointment! The product doesn't match the description at all.",
-        "I'm very satisfied with my purchase, the quality is there.",
-        "It's horrible, I absolutely don't recommend this experience.",
-        "A wonderful experience! I will definitely come back.",
-    ],
-    'es': [
-        "¡Me encanta esta aplicación, es increíble y muy intuitiva!",
-        "El servicio al cliente es excelente, recibí ayuda rápida y eficiente.",
-        "¡Qué decepción! El producto no coincide en absoluto con la descripción.",
-        "Estoy muy satisfecho con mi compra, la calidad está presente.",
-        "Es horrible, no recomiendo absolutamente esta experiencia.",
-        "¡Una experiencia maravillosa! Definitivamente volveré.",
-    ],
-    'ar': [
-        "أحب هذا التطبيق، إنه مذهل وسهل الاستخدام للغاية!",
-        "خدمة العملاء ممتازة، تلقيت مساعدة سريعة وفعالة.",
-        "يا للخيبة! المنتج لا يتطابق مع الوصف على الإطلاق.",
-        "أنا راضٍ جدًا عن عملية الشراء، الجودة موجودة.",
-        "إنه فظيع، لا أوصي بهذه التجربة على الإطلاق.",
-        "تجربة رائعة! سأعود بالتأكيد.",
-    ]
+# Classe CSS, clé de traduction et emoji de chaque sentiment
+SENTIMENT_DISPLAY = {
+    'POSITIVE': ('positive-result', 'positive', '😊'),
+    'NEUTRAL': ('neutral-result', 'neutral', '😐'),
+    'NEGATIVE': ('negative-result', 'negative', '😔'),
 }
 
+# Phrases surlignées selon leur sentiment (mode détail par phrase)
+HIGHLIGHT_COLORS = {
+    'POSITIVE': 'rgba(16, 185, 129, 0.25)',
+    'NEUTRAL': 'rgba(245, 158, 11, 0.25)',
+    'NEGATIVE': 'rgba(239, 68, 68, 0.25)',
+}
+
+def highlight_sentences(text, sentences):
+    parts = []
+    position = 0
+    for sentence in sentences:
+        parts.append(html.escape(text[position:sentence['start']]))
+        parts.append(
+            f'<span style="background: {HIGHLIGHT_COLORS[sentence["label"]]}; border-radius: 4px; padding: 0 2px;" '
+            f'title="{sentence["label"]} · {sentence["stars"]}★ · {sentence["score"]:.0%}">'
+            f'{html.escape(text[sentence["start"]:sentence["end"]])}</span>'
+        )
+        position = sentence['end']
+    parts.append(html.escape(text[position:]))
+    return f'<div class="result-box" style="line-height: 1.9;">{"".join(parts)}</div>'
+
 def t(key):
     return translations[st.session_state.language].get(key, key)
 
+# ---------- Graphiques du tableau de bord ----------
+
+# Figures mises en cache par version des données, langue et période : changer
+# de page ou de langue ne reconstruit pas les figures déjà construites
+@st.cache_data(max_entries=64, show_spinner=False)
+def build_dashboard_figures(data_version, language, start_day, end_day):
+    import dashboard
+    return dashboard.build_figures(history_store, translations[language], start_day, end_day)
+
+# Période réétiquetée avec une autre politique que celle du serveur :
+# relecture des probabilités stockées, calcul en NumPy, pas d'inférence
+@st.cache_data(max_entries=16, show_spinner=False)
+def build_relabeled_dashboard(data_version, language, start_day, end_day, policy_name, thresholds):
+    import dashboard
+    arrays = dashboard.relabel(history_store, start_day, end_day, policy_name, *thresholds)
+    figures = dashboard.build_figures(history_store, translations[language], start_day, end_day, relabeled=arrays)
+    return dashboard.relabeled_summary(arrays), figures
+
 # CSS personnalisé
 st.markdown("""
 <style>
@@ -319,6 +361,7 @@ st.markdown("""
     }
     .positive-result { border-left: 6px solid #10b981; }
     .negative-result { border-left: 6px solid #ef4444; }
+    .neutral-result { border-left: 6px solid #f59e0b; }
     .metric-card {
         background: rgba(255, 255, 255, 0.95);
         border-radius: 15px;
@@ -374,12 +417,13 @@ with st.sidebar:
     st.markdown("---")
     st.markdown(f"### {t('history')}")
     
-    if st.session_state.history:
+    history_count = history_store.total()
+    if history_count:
         if st.button(t('clear_history'), use_container_width=True, type="secondary"):
-            st.session_state.history = []
+            history_store.clear()
             st.rerun()
         
-        st.markdown(f"**{len(st.session_state.history)} analyse(s)**")
+        st.markdown(f"**{history_count} analyse(s)**")
     else:
         st.info(t('no_history'))
 
@@ -404,206 +448,279 @@ if st.session_state.current_page == t('analysis'):
         if user_text != st.session_state.current_text:
             st.session_state.current_text = user_text
         
+        breakdown_mode = st.checkbox(t('sentence_breakdown'))
+        
         if st.button(t('analyze_btn'), use_container_width=True):
             if user_text.strip() == "":
                 st.warning(t('warning_empty'))
             else:
-                import requests
                 with st.spinner(t('analyzing')):
                     try:
-                        response = requests.post(
-                            "http://127.0.0.1:8000/predict",
-                            json={"text": user_text},
-                            timeout=10
-                        )
-                        
-                        if response.status_code == 200:
-                            data = response.json()
-                            label = data['label']
-                            score = data['score']
-                            
-                            history_item = {
-                                'text': user_text,
-                                'label': label,
-                                'score': score,
-                                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                'emoji': '😊' if label == "POSITIVE" else '😔',
-                                'word_count': len(user_text.split())
-                            }
-                            st.session_state.history.append(history_item)
-                            
-                            result_class = "positive-result" if label == "POSITIVE" else "negative-result"
-                            sentiment_text = t('positive') if label == "POSITIVE" else t('negative')
-                            
-                            st.markdown(f"""
-                            <div class="result-box {result_class}">
-                                <h2 style="margin: 0; color: #1f2937;">
-                                    {'😊' if label == "POSITIVE" else '😔'} {sentiment_text}
-                                </h2>
-                                <p style="font-size: 1.1rem; color: #6b7280; margin-top: 0.5rem;">
-                                    {t('confidence')} : <strong>{score:.1%}</strong>
-                                </p>
-                            </div>
-                            """, unsafe_allow_html=True)
-                            
-                            st.progress(score)
-                            
-                            metric_col1, metric_col2, metric_col3 = st.columns(3)
-                            
-                            with metric_col1:
-                                st.metric(label=f"📊 {t('sentiment')}", value=label)
-                            
-                            with metric_col2:
-                                st.metric(label=f"🎯 {t('confidence')}", value=f"{score:.1%}")
-                            
-                            with metric_col3:
-                                st.metric(label=f"📝 {t('words_analyzed')}", value=len(user_text.split()))
-                            
-                            st.balloons()
-                            
+                        if breakdown_mode:
+                            # Toutes les phrases analysées en un seul passage groupé
+                            data = inference_client.predict_breakdown([user_text], st.session_state.language)[0]
                         else:
-                            st.error(t('error_server'))
-                            
-                    except requests.exceptions.Timeout:
+                            data = inference_client.predict(user_text)
+                        label = data['label']
+                        score = data['score']
+                        
+                        history_item = {
+                            'text': user_text,
+                            'label': label,
+                            'score': score,
+                            'stars': data.get('stars'),
+                            'probs': data.get('probs'),
+                            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                            'word_count': len(user_text.split())
+                        }
+                        history_store.append(history_item)
+                        
+                        result_class, sentiment_key, emoji = SENTIMENT_DISPLAY[label]
+                        sentiment_text = t(sentiment_key)
+                        
+                        st.markdown(f"""
+                        <div class="result-box {result_class}">
+                            <h2 style="margin: 0; color: #1f2937;">
+                                {emoji} {sentiment_text}
+                            </h2>
+                            <p style="font-size: 1.1rem; color: #6b7280; margin-top: 0.5rem;">
+                                {t('confidence')} : <strong>{score:.1%}</strong>
+                            </p>
+                        </div>
+                        """, unsafe_allow_html=True)
+                        
+                        st.progress(score)
+                        
+                        metric_col1, metric_col2, metric_col3 = st.columns(3)
+                        
+                        with metric_col1:
+                            st.metric(label=f"📊 {t('sentiment')}", value=label)
+                        
+                        with metric_col2:
+                            st.metric(label=f"🎯 {t('confidence')}", value=f"{score:.1%}")
+                        
+                        with metric_col3:
+                            st.metric(label=f"📝 {t('words_analyzed')}", value=len(user_text.split()))
+                        
+                        if breakdown_mode and data.get('sentences'):
+                            st.markdown(f"#### {t('sentence_breakdown')}")
+                            st.markdown(highlight_sentences(user_text, data['sentences']), unsafe_allow_html=True)
+                        
+                        st.balloons()
+                        
+                    except ServiceUnavailable:
+                        st.warning(t('model_loading'))
+                        
+                    except ServiceTimeout:
                         st.error(t('error_timeout'))
                         
-                    except requests.exceptions.ConnectionError:
+                    except ServiceUnreachable:
                         st.error(t('error_connection'))
                         
+                    except ServiceError:
+                        st.error(t('error_server'))
+                        
                     except Exception as e:
                         st.error(f"❌ {str(e)}")
+        
+        # Analyse d'un fichier CSV / Parquet, lu et analysé par paquets :
+        # la mémoire reste stable quelle que soit la taille du fichier
+        st.markdown("---")
+        st.markdown(f"### {t('file_analysis')}")
+        uploaded_file = st.file_uploader(t('upload_label'), type=['csv', 'parquet'])
+        
+        columns = None
+        if uploaded_file is not None:
+            import uploads
+            try:
+                columns = uploads.list_columns(uploaded_file, uploaded_file.name)
+            except (ValueError, OSError, ImportError) as e:
+                st.error(f"{t('error_file')} ({e})")
+        
+        if columns:
+            text_column = st.selectbox(
+                t('text_column'),
+                columns,
+                index=columns.index('text') if 'text' in columns else 0
+            )
+            
+            if st.button(t('analyze_file_btn'), use_container_width=True):
+                progress = st.progress(0.0)
+                status = st.empty()
+                partial_table = st.empty()
+                # Un dossier temporaire par analyse, supprimé à l'analyse suivante
+                # (ou en cas d'échec) ; le fichier reste téléchargeable entre-temps
+                previous = st.session_state.pop('scored_file', None)
+                if previous:
+                    previous['directory'].cleanup()
+                job_directory = tempfile.TemporaryDirectory(prefix='scored_')
+                output_path = os.path.join(job_directory.name, f"{os.path.splitext(uploaded_file.name)[0]}_scored.csv")
+                scored = 0
+                
+                try:
+                    total_rows = uploads.count_rows(uploaded_file, uploaded_file.name)
+                    with open(output_path, 'w', newline='', encoding='utf-8') as output:
+                        for i, chunk in enumerate(uploads.read_chunks(uploaded_file, uploaded_file.name)):
+                            texts = uploads.chunk_texts(chunk, text_column)
+                            predictions = inference_client.predict_many(texts)
+                            scored_chunk = uploads.add_predictions(chunk, predictions)
+                            scored_chunk.to_csv(output, header=(i == 0), index=False)
+                            
+                            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                            history_store.append_many([
+                                {
+                                    'text': text,
+                                    'label': prediction['label'],
+                                    'score': prediction['score'],
+                                    'stars': prediction.get('stars'),
+                                    'probs': prediction.get('probs'),
+                                    'timestamp': timestamp,
+                                    'word_count': len(text.split())
+                                }
+                                for text, prediction in zip(texts, predictions)
+                            ])
+                            
+                            scored += len(chunk)
+                            progress.progress(min(scored / total_rows, 1.0) if total_rows else 1.0)
+                            status.markdown(f"**{scored} / {max(total_rows, scored)}** {t('rows_scored')}")
+                            partial_table.dataframe(scored_chunk.tail(20), use_container_width=True, hide_index=True)
+                    
+                    progress.progress(1.0)
+                    st.session_state.scored_file = {
+                        'source': uploaded_file.file_id, 'path': output_path, 'directory': job_directory
+                    }
+                
+                except ServiceUnavailable:
+                    st.warning(t('model_loading'))
+                
+                except ServiceTimeout:
+                    st.error(t('error_timeout'))
+                
+                except ServiceUnreachable:
+                    st.error(t('error_connection'))
+                
+                except ServiceError:
+                    st.error(t('error_server'))
+                
+                # Colonne absente, fichier mal formé, pyarrow manquant
+                except (KeyError, ValueError, OSError, ImportError) as e:
+                    st.error(f"{t('error_file')} ({e})")
+                
+                finally:
+                    if 'scored_file' not in st.session_state:
+                        job_directory.cleanup()
+            
+            # Le bouton reste disponible après le rechargement provoqué par le téléchargement
+            scored_file = st.session_state.get('scored_file')
+            if scored_file and scored_file['source'] != uploaded_file.file_id:
+                scored_file['directory'].cleanup()
+                del st.session_state['scored_file']
+                scored_file = None
+            if scored_file and scored_file['source'] == uploaded_file.file_id and os.path.exists(scored_file['path']):
+                with open(scored_file['path'], 'rb') as scored_output:
+                    st.download_button(
+                        t('download_scored'),
+                        data=scored_output,
+                        file_name=os.path.basename(scored_file['path']),
+                        mime='text/csv',
+                        use_container_width=True
+                    )
 
 # PAGE: TABLEAU DE BORD
 elif st.session_state.current_page == t('dashboard'):
     st.markdown(f'<h1 class="title">📊 {t("dashboard")}</h1>', unsafe_allow_html=True)
     
-    if not st.session_state.history:
+    min_ts, max_ts = history_store.time_bounds()
+    if min_ts is not None:
+        # Période analysée (par défaut : tout l'historique)
+        date_range = st.date_input(
+            t('date_range'),
+            value=(datetime.fromisoformat(min_ts).date(), datetime.fromisoformat(max_ts).date())
+        )
+        if not isinstance(date_range, (list, tuple)):
+            date_range = (date_range,)
+        start_day = str(date_range[0]) if date_range else None
+        end_day = str(date_range[-1]) if date_range else None
+        
+        # Politique de décision : celle du serveur par défaut (agrégats
+        # stockés), sinon réétiquetage des probabilités de la période
+        import policy
+        policy_name = st.selectbox(
+            t('decision_policy'), policy.POLICIES, index=policy.POLICIES.index(policy.SENTIMENT_POLICY)
+        )
+        default_thresholds = (policy.POLICY_NEGATIVE_THRESHOLD, policy.POLICY_POSITIVE_THRESHOLD)
+        thresholds = default_thresholds
+        if policy_name == 'expected':
+            thresholds = tuple(st.slider(t('expected_thresholds'), 1.0, 5.0, value=default_thresholds, step=0.1))
+        
+        if policy_name == policy.SENTIMENT_POLICY and thresholds == default_thresholds:
+            # Agrégats tenus à jour à chaque écriture : coût indépendant du nombre d'analyses
+            summary = history_store.summary(start_day, end_day)
+            figures = None
+        else:
+            summary, figures = build_relabeled_dashboard(
+                history_store.data_version(), st.session_state.language, start_day, end_day,
+                policy_name, thresholds
+            )
+    
+    if min_ts is None or summary['total'] == 0:
         st.info(t('no_data'))
     else:
-        # Créer un DataFrame
-        df = pd.DataFrame(st.session_state.history)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df['hour'] = df['timestamp'].dt.hour
-        
         # Métriques principales
-        col1, col2, col3, col4 = st.columns(4)
+        total = summary['total']
+        positive = summary['positive']
+        negative = summary['negative']
+        neutral = summary.get('neutral', 0)
+        avg_conf = summary['avg_score']
         
-        total = len(df)
-        positive = len(df[df['label'] == 'POSITIVE'])
-        negative = len(df[df['label'] == 'NEGATIVE'])
-        avg_conf = df['score'].mean()
+        cards = [
+            ('#667eea', f"📈 {total}", t('total_analyses')),
+            ('#10b981', f"😊 {positive}", t('positive_count')),
+        ]
+        if neutral:
+            cards.append(('#f59e0b', f"😐 {neutral}", t('neutral_count')))
+        cards += [
+            ('#ef4444', f"😔 {negative}", t('negative_count')),
+            ('#f59e0b', f"🎯 {avg_conf:.1%}", t('avg_confidence')),
+        ]
         
-        with col1:
-            st.markdown(f"""
-            <div class="metric-card">
-                <h3 style="color: #667eea; margin: 0;">📈 {total}</h3>
-                <p style="color: #6b7280; margin: 0.5rem 0 0 0;">{t('total_analyses')}</p>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col2:
-            st.markdown(f"""
-            <div class="metric-card">
-                <h3 style="color: #10b981; margin: 0;">😊 {positive}</h3>
-                <p style="color: #6b7280; margin: 0.5rem 0 0 0;">{t('positive_count')}</p>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col3:
-            st.markdown(f"""
-            <div class="metric-card">
-                <h3 style="color: #ef4444; margin: 0;">😔 {negative}</h3>
-                <p style="color: #6b7280; margin: 0.5rem 0 0 0;">{t('negative_count')}</p>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col4:
-            st.markdown(f"""
-            <div class="metric-card">
-                <h3 style="color: #f59e0b; margin: 0;">🎯 {avg_conf:.1%}</h3>
-                <p style="color: #6b7280; margin: 0.5rem 0 0 0;">{t('avg_confidence')}</p>
-            </div>
-            """, unsafe_allow_html=True)
+        for column, (color, value, caption) in zip(st.columns(len(cards)), cards):
+            with column:
+                st.markdown(f"""
+                <div class="metric-card">
+                    <h3 style="color: {color}; margin: 0;">{value}</h3>
+                    <p style="color: #6b7280; margin: 0.5rem 0 0 0;">{caption}</p>
+                </div>
+                """, unsafe_allow_html=True)
         
         st.markdown("<br>", unsafe_allow_html=True)
         
-        # Graphiques
+        # Graphiques (reconstruits seulement si les données, la langue ou la période changent)
+        if figures is None:
+            figures = build_dashboard_figures(
+                history_store.data_version(), st.session_state.language, start_day, end_day
+            )
         col1, col2 = st.columns(2)
         
         with col1:
-            # Distribution des sentiments
-            fig_pie = px.pie(
-                df, 
-                names='label', 
-                title=t('sentiment_distribution'),
-                color='label',
-                color_discrete_map={'POSITIVE': '#10b981', 'NEGATIVE': '#ef4444'}
-            )
-            fig_pie.update_layout(
-                plot_bgcolor='rgba(255, 255, 255, 0.95)',
-                paper_bgcolor='rgba(255, 255, 255, 0.95)',
-            )
-            st.plotly_chart(fig_pie, use_container_width=True)
+            st.plotly_chart(figures['pie'], use_container_width=True)
         
         with col2:
-            # Distribution du nombre de mots
-            fig_hist = px.histogram(
-                df, 
-                x='word_count', 
-                title=t('word_count_distribution'),
-                color='label',
-                color_discrete_map={'POSITIVE': '#10b981', 'NEGATIVE': '#ef4444'},
-                nbins=20
-            )
-            fig_hist.update_layout(
-                plot_bgcolor='rgba(255, 255, 255, 0.95)',
-                paper_bgcolor='rgba(255, 255, 255, 0.95)',
-            )
-            st.plotly_chart(fig_hist, use_container_width=True)
-        
-        # Évolution de la confiance
-        df_sorted = df.sort_values('timestamp')
-        df_sorted['index'] = range(1, len(df_sorted) + 1)
+            st.plotly_chart(figures['word_count'], use_container_width=True)
         
-        fig_line = px.line(
-            df_sorted, 
-            x='index', 
-            y='score',
-            title=t('confidence_evolution'),
-            color='label',
-            color_discrete_map={'POSITIVE': '#10b981', 'NEGATIVE': '#ef4444'},
-            markers=True
-        )
-        fig_line.update_layout(
-            plot_bgcolor='rgba(255, 255, 255, 0.95)',
-            paper_bgcolor='rgba(255, 255, 255, 0.95)',
-            xaxis_title="Analyse #",
-            yaxis_title=t('confidence')
-        )
-        st.plotly_chart(fig_line, use_container_width=True)
-        # Sentiments par heure
-        if len(df['hour'].unique()) > 1:
-            hourly_data = df.groupby(['hour', 'label']).size().reset_index(name='count')
-            fig_bar = px.bar(
-                hourly_data, 
-                x='hour', 
-                y='count',
-                color='label',
-                title=t('sentiment_by_time'),
-                color_discrete_map={'POSITIVE': '#10b981', 'NEGATIVE': '#ef4444'},
-                barmode='group'
-            )
-            fig_bar.update_layout(
-                plot_bgcolor='rgba(255, 255, 255, 0.95)',
-                paper_bgcolor='rgba(255, 255, 255, 0.95)',
-                xaxis_title="Heure",
-                yaxis_title="Nombre"
-            )
-            st.plotly_chart(fig_bar, use_container_width=True)
+        st.plotly_chart(figures['confidence'], use_container_width=True)
+        if figures['hourly'] is not None:
+            st.plotly_chart(figures['hourly'], use_container_width=True)
         
         # Tableau des analyses récentes
         st.markdown(f"### {t('recent_analyses')}")
-        recent_df = df.sort_values('timestamp', ascending=False).head(10)
+        import pandas as pd
+        recent_df = pd.DataFrame(history_store.query(
+            f"{start_day} 00:00:00" if start_day else None,
+            f"{end_day} 23:59:59" if end_day else None,
+            limit=10
+        ))
+        recent_df['emoji'] = recent_df['label'].map(lambda label: SENTIMENT_DISPLAY[label][2])
         display_df = recent_df[['emoji', 'text', 'label', 'score', 'word_count', 'timestamp']].copy()
         display_df.columns = ['', 'Texte', 'Sentiment', 'Confiance', 'Mots', 'Date/Heure']
         display_df['Confiance'] = display_df['Confiance'].apply(lambda x: f"{x:.1%}")
@@ -0,0 +1,218 @@
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import benchmark
+import tuning
+
+# Réglage automatique (commande `python cli.py autotune`) : mesure sur la
+# machine courante, avec des textes représentatifs, les combinaisons de
+#   - threads torch intra-op et inter-op,
+#   - voie rapide ou pipeline, torch.inference_mode ou torch.no_grad,
+#   - tailles de lot,
+# puis l'attente du micro-batching (BATCH_MAX_WAIT_MS) sous charge réelle
+# sur /predict. La meilleure configuration est écrite dans le profil
+# chargé au démarrage du serveur (voir tuning.py).
+
+BATCH_SIZES = (1, 8, 16, 32, 64)
+MAX_WAIT_CANDIDATES = (0, 2, 5, 10, 20)
+# Répartition des longueurs (en mots) du corpus synthétique : surtout des textes courts
+SYNTHETIC_LENGTHS = (8, 8, 16, 16, 32, 64)
+# Plus petite taille de lot atteignant cette part du débit maximal : au-delà,
+# la latence augmente pour un gain de débit marginal
+BATCH_EFFICIENCY = 0.9
+
+
+def thread_candidates(cpu_count=None):
+    cpu_count = cpu_count or os.cpu_count() or 1
+    candidates = {cpu_count}
+    threads = 1
+    while threads < cpu_count:
+        candidates.add(threads)
+        threads *= 2
+    return sorted(candidates)
+
+def interop_candidates(cpu_count=None):
+    cpu_count = cpu_count or os.cpu_count() or 1
+    return sorted({1, min(2, cpu_count), min(4, cpu_count)})
+
+# Textes d'un corpus local (colonne `column`), sinon corpus synthétique
+# multilingue aux longueurs de SYNTHETIC_LENGTHS
+def representative_texts(corpus=None, column="text", size=256, seed=0):
+    if corpus:
+        import uploads
+        from scoring import read_batches
+        texts = []
+        for chunk in read_batches(corpus, 256):
+            texts.extend(text for text in uploads.chunk_texts(chunk, column) if text.strip())
+            if len(texts) >= size:
+                break
+        if not texts:
+            raise ValueError(f"Aucun texte dans la colonne {column} de {corpus}")
+        return texts[:size]
+    per_length = math.ceil(size / len(SYNTHETIC_LENGTHS))
+    texts = []
+    for i, words in enumerate(SYNTHETIC_LENGTHS):
+        texts.extend(benchmark.synthetic_corpus(per_length, words, seed + i))
+    return texts[:size]
+
+
+# ---------- Débit hors serveur ----------
+
+# Exécuté dans un processus neuf par valeur inter-op : torch ne permet de la
+# fixer qu'une fois, avant le premier calcul parallèle
+SWEEP_SCRIPT = """
+import json, sys
+import autotune
+print(json.dumps(autotune.measure_in_process(json.load(sys.stdin))))
+"""
+
+def _child_env(settings=None):
+    env = dict(os.environ, TUNING_PROFILE="", HF_HUB_OFFLINE=os.environ.get("HF_HUB_OFFLINE", "1"))
+    env.update({name: str(value) for name, value in (settings or {}).items()})
+    return env
+
+# Lots successifs pris dans `texts` (sans cache de tokens) : temps médian
+def _time_batches(texts, batch_size, rounds):
+    import model
+    position = 0
+    timings = []
+    for round_ in range(rounds + 1):
+        batch = [texts[(position + i) % len(texts)] for i in range(batch_size)]
+        position += batch_size
+        start = time.perf_counter()
+        model.classify_texts(batch)
+        if round_:
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def measure_in_process(options):
+    import model
+    from cache import TokenCache
+    model.set_torch_threads(1, options["threads"][0], options["interop"])
+    model.load_model()
+    model.token_cache = TokenCache(0)
+    results = []
+    for threads in options["threads"]:
+        model.set_torch_threads(1, threads)
+        for fast_path in options["fast_path"]:
+            for grad_mode in options["grad_modes"]:
+                model.INFERENCE_FAST_PATH = fast_path
+                model.INFERENCE_GRAD_MODE = grad_mode
+                for batch_size in options["batch_sizes"]:
+                    seconds = _time_batches(options["texts"], batch_size, options["rounds"])
+                    results.append({
+                        "interop_threads": options["interop"],
+                        "threads": threads,
+                        "fast_path": fast_path,
+                        "grad_mode": grad_mode,
+                        "batch_size": batch_size,
+                        "batch_ms": round(seconds * 1000, 3),
+                        "texts_per_s": round(batch_size / seconds, 2),
+                    })
+    return results
+
+def sweep_throughput(texts, threads, interop, batch_sizes=BATCH_SIZES, rounds=5,
+                     fast_path=(True, False), grad_modes=("inference", "no_grad"), log=None):
+    import model
+    rows = []
+    for interop_threads in interop:
+        if log:
+            log(f"[autotune] débit, {interop_threads} thread(s) inter-op...")
+        options = {
+            "texts": texts, "threads": list(threads), "interop": interop_threads,
+            "batch_sizes": list(batch_sizes), "rounds": rounds,
+            "fast_path": list(fast_path), "grad_modes": [mode for mode in grad_modes if mode in model.GRAD_MODES],
+        }
+        output = subprocess.run(
+            [sys.executable, "-c", SWEEP_SCRIPT],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=_child_env(),
+            input=json.dumps(options), check=True, capture_output=True, text=True
+        ).stdout
+        rows.extend(json.loads(output.strip().splitlines()[-1]))
+    return rows
+
+# Configuration au meilleur débit moyen (géométrique) sur toutes les tailles
+# de lot, puis tailles de lot retenues pour cette configuration
+def best_throughput(rows):
+    groups = {}
+    for row in rows:
+        key = (row["interop_threads"], row["threads"], row["fast_path"], row["grad_mode"])
+        groups.setdefault(key, []).append(row)
+    key, group = max(
+        groups.items(),
+        key=lambda item: statistics.geometric_mean(row["texts_per_s"] for row in item[1])
+    )
+    interop_threads, threads, fast_path, grad_mode = key
+    peak = max(row["texts_per_s"] for row in group)
+    by_size = sorted(group, key=lambda row: row["batch_size"])
+    max_size = next(row["batch_size"] for row in by_size if row["texts_per_s"] >= BATCH_EFFICIENCY * peak)
+    chunk_size = max(row["batch_size"] for row in by_size if row["texts_per_s"] == peak)
+    return {
+        "INFERENCE_THREADS": threads,
+        "INFERENCE_INTEROP_THREADS": interop_threads,
+        "INFERENCE_FAST_PATH": "1" if fast_path else "0",
+        "INFERENCE_GRAD_MODE": grad_mode,
+        "BATCH_MAX_SIZE": max_size,
+        "BATCH_CHUNK_SIZE": max(chunk_size, max_size),
+    }
+
+
+# ---------- Attente du micro-batching sous charge ----------
+
+# Un serveur `cli.py serve` par valeur de BATCH_MAX_WAIT_MS, chargé par
+# `concurrency` clients comme dans `cli.py bench`
+def sweep_max_wait(settings, candidates=MAX_WAIT_CANDIDATES, concurrency=16, requests_count=400, seed=0, log=None):
+    rows = []
+    for max_wait in candidates:
+        if log:
+            log(f"[autotune] latence, BATCH_MAX_WAIT_MS={max_wait}...")
+        port = benchmark.free_port()
+        server = subprocess.Popen(
+            [sys.executable, "cli.py", "serve", "--port", str(port), "--log-level", "error"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=_child_env(dict(settings, BATCH_MAX_WAIT_MS=max_wait)),
+        )
+        try:
+            result = benchmark.bench_latency(concurrency, requests_count, url=f"http://127.0.0.1:{port}", seed=seed)[0]
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        result.update(name=f"max_wait_ms={max_wait}", max_wait_ms=max_wait)
+        rows.append(result)
+    return rows
+
+# Débit maximal parmi les attentes dont le p99 reste à `slack` près du meilleur
+def best_max_wait(rows, slack=0.2):
+    rows = [row for row in rows if not row["errors"] and "p99_ms" in row]
+    if not rows:
+        return None
+    best_p99 = min(row["p99_ms"] for row in rows)
+    eligible = [row for row in rows if row["p99_ms"] <= best_p99 * (1 + slack)]
+    return max(eligible, key=lambda row: row["requests_per_s"])["max_wait_ms"]
+
+
+def autotune(output=tuning.TUNING_PROFILE, corpus=None, column="text", samples=256, threads=None, interop=None,
+             batch_sizes=BATCH_SIZES, max_waits=MAX_WAIT_CANDIDATES, rounds=5, concurrency=16,
+             requests_count=400, slack=0.2, latency=True, seed=0, log=None):
+    log = log or (lambda message: print(message, file=sys.stderr))
+    benchmark.offline()
+    texts = representative_texts(corpus, column, samples, seed)
+    throughput = sweep_throughput(
+        texts, threads or thread_candidates(), interop or interop_candidates(), batch_sizes, rounds, log=log
+    )
+    settings = best_throughput(throughput)
+    latency_rows = []
+    if latency:
+        latency_rows = sweep_max_wait(settings, max_waits, concurrency, requests_count, seed, log=log)
+        max_wait = best_max_wait(latency_rows, slack)
+        if max_wait is not None:
+            settings["BATCH_MAX_WAIT_MS"] = max_wait
+    return tuning.write_profile(
+        output, settings, benchmark.environment(),
+        {"samples": len(texts), "corpus": corpus, "throughput": throughput, "latency": latency_rows}
+    )
@@ -0,0 +1,166 @@
+import os
+import time
+
+# transformers est importé dans chaque fonction : lire BACKENDS (par exemple
+# pour les choix de la CLI) ne coûte pas l'import de torch
+
+BACKENDS = ("torch-fp32", "torch-int8-dynamic", "onnx", "distilled")
+# Modèles convertis, créés une seule fois puis réutilisés au démarrage
+MODEL_CACHE_DIR = os.environ.get("MODEL_CACHE_DIR", ".model_cache")
+
+
+def export_dir(backend, model_name):
+    return os.path.join(MODEL_CACHE_DIR, backend, model_name.replace("/", "--"))
+
+def build_pipeline(model, tokenizer):
+    from transformers import pipeline
+    return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+
+
+# ---------- torch-fp32 : pipeline PyTorch d'origine ----------
+# `cli.py export --backend torch-fp32` enregistre un instantané local
+# (poids safetensors + tokenizer) : le démarrage le charge directement,
+# sans résolution ni requête vers le hub
+
+def _has_snapshot(model_name):
+    return os.path.exists(os.path.join(export_dir("torch-fp32", model_name), "config.json"))
+
+# Source des poids fp32 : l'instantané local s'il existe, sinon le hub
+def source(model_name):
+    if _has_snapshot(model_name):
+        return export_dir("torch-fp32", model_name)
+    return model_name
+
+def export_torch_fp32(model_name):
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+    target = export_dir("torch-fp32", model_name)
+    os.makedirs(target, exist_ok=True)
+    AutoModelForSequenceClassification.from_pretrained(model_name).save_pretrained(target, safe_serialization=True)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(target)
+    return target
+
+def load_torch_fp32(model_name):
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer, pipeline
+    if not _has_snapshot(model_name):
+        return pipeline("sentiment-analysis", model=model_name)
+    target = export_dir("torch-fp32", model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(target, local_files_only=True)
+    return build_pipeline(model, AutoTokenizer.from_pretrained(target, local_files_only=True))
+
+
+# ---------- torch-int8-dynamic : couches Linear quantifiées en int8 ----------
+
+def _quantize(model):
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def export_torch_int8_dynamic(model_name):
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+    target = export_dir("torch-int8-dynamic", model_name)
+    os.makedirs(target, exist_ok=True)
+    model = AutoModelForSequenceClassification.from_pretrained(source(model_name))
+    torch.save(_quantize(model).state_dict(), os.path.join(target, "quantized.pt"))
+    model.config.save_pretrained(target)
+    AutoTokenizer.from_pretrained(source(model_name)).save_pretrained(target)
+    return target
+
+def load_torch_int8_dynamic(model_name):
+    import torch
+    from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer
+    target = export_dir("torch-int8-dynamic", model_name)
+    if not os.path.exists(os.path.join(target, "quantized.pt")):
+        export_torch_int8_dynamic(model_name)
+    # Squelette construit depuis la config, puis poids int8 déjà convertis
+    model = _quantize(AutoModelForSequenceClassification.from_config(AutoConfig.from_pretrained(target)))
+    model.load_state_dict(torch.load(os.path.join(target, "quantized.pt")))
+    model.eval()
+    return build_pipeline(model, AutoTokenizer.from_pretrained(target))
+
+
+# ---------- onnx : export ONNX exécuté par ONNX Runtime ----------
+
+def _ort_model_class():
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+    except ImportError:
+        raise RuntimeError("Le backend onnx nécessite : pip install optimum[onnxruntime]")
+    return ORTModelForSequenceClassification
+
+def export_onnx(model_name):
+    from transformers import AutoTokenizer
+    target = export_dir("onnx", model_name)
+    model = _ort_model_class().from_pretrained(source(model_name), export=True)
+    model.save_pretrained(target)
+    AutoTokenizer.from_pretrained(source(model_name)).save_pretrained(target)
+    return target
+
+def load_onnx(model_name):
+    from transformers import AutoTokenizer
+    target = export_dir("onnx", model_name)
+    if not os.path.exists(os.path.join(target, "model.onnx")):
+        export_onnx(model_name)
+    model = _ort_model_class().from_pretrained(target)
+    return build_pipeline(model, AutoTokenizer.from_pretrained(target))
+
+
+# ---------- distilled : élève entraîné sur les sorties du modèle (distill.py) ----------
+# Pas de conversion automatique : l'entraînement demande un corpus,
+# `python cli.py distill corpus.jsonl` crée le modèle
+
+def load_distilled(model_name):
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+    target = export_dir("distilled", model_name)
+    if not os.path.exists(os.path.join(target, "config.json")):
+        raise RuntimeError(f"Aucun modèle distillé pour {model_name} : lancer python cli.py distill <corpus>")
+    model = AutoModelForSequenceClassification.from_pretrained(target, local_files_only=True)
+    return build_pipeline(model, AutoTokenizer.from_pretrained(target, local_files_only=True))
+
+
+LOADERS = {
+    "torch-fp32": load_torch_fp32,
+    "torch-int8-dynamic": load_torch_int8_dynamic,
+    "onnx": load_onnx,
+    "distilled": load_distilled,
+}
+EXPORTERS = {
+    "torch-fp32": export_torch_fp32,
+    "torch-int8-dynamic": export_torch_int8_dynamic,
+    "onnx": export_onnx,
+}
+
+def load_classifier(backend, model_name):
+    if backend not in LOADERS:
+        raise ValueError(f"Backend inconnu : {backend} (choix : {', '.join(BACKENDS)})")
+    return LOADERS[backend](model_name)
+
+# Force la conversion (à lancer une fois, par exemple à la construction de l'image)
+def export(backend, model_name):
+    if backend not in EXPORTERS:
+        return None
+    return EXPORTERS[backend](model_name)
+
+
+# Compare les étoiles prédites par un backend à celles du modèle fp32 de référence
+def parity_report(classify_candidate, classify_reference, texts):
+    start = time.perf_counter()
+    reference = classify_reference(texts)
+    reference_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    candidate = classify_candidate(texts)
+    candidate_seconds = time.perf_counter() - start
+
+    stars = sum(c["stars"] == r["stars"] for c, r in zip(candidate, reference))
+    labels = sum(c["label"] == r["label"] for c, r in zip(candidate, reference))
+    mismatches = [
+        {"text": text, "reference": r["stars"], "candidate": c["stars"]}
+        for text, c, r in zip(texts, candidate, reference) if c["stars"] != r["stars"]
+    ]
+    return {
+        "samples": len(texts),
+        "star_agreement": stars / len(texts),
+        "label_agreement": labels / len(texts),
+        "reference_seconds": round(reference_seconds, 4),
+        "candidate_seconds": round(candidate_seconds, 4),
+        "mismatches": mismatches,
+    }
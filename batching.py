@@ -0,0 +1,116 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class QueueFullError(Exception):
+    pass
+
+
+# Exécuteur d'inférence dédié qui regroupe les requêtes concurrentes pour
+# un seul passage du modèle.
+# - max_batch_size borne la taille du lot, max_wait_ms le temps d'attente
+#   après la première requête : plus il est grand, plus les lots sont
+#   pleins (débit) mais plus la latence p50 augmente.
+# - workers threads consomment la file, chacun avec son propre lot.
+# - max_queue borne le nombre de textes en attente ou en cours (0 = illimité) :
+#   au-delà, submit() lève QueueFullError au lieu de laisser la latence exploser.
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5.0, workers=1, max_queue=0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.workers = max(1, int(workers))
+        self.max_queue = max(0, int(max_queue))
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._slots = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._run, daemon=True, name=f"inference-{i}")
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    # Une requête unitaire : rejetée immédiatement si la file est pleine
+    def submit(self, text):
+        return self._submit([text], block=False, single=True)
+
+    def predict(self, text):
+        return self.submit(text).result()
+
+    # Un paquet déjà constitué (traitement en masse) : attend qu'une place
+    # se libère plutôt que d'échouer
+    def submit_many(self, texts, block=True):
+        return self._submit(list(texts), block=block, single=False)
+
+    def _submit(self, texts, block, single):
+        self._acquire(len(texts), block)
+        future = Future()
+        self._queue.put((texts, future, single))
+        return future
+
+    def _acquire(self, count, block):
+        with self._slots:
+            if self.max_queue:
+                # Un paquet plus gros que la file passe quand même si elle est vide
+                while self._pending and self._pending + count > self.max_queue:
+                    if not block:
+                        raise QueueFullError(f"{self._pending} textes déjà en attente")
+                    self._slots.wait()
+            self._pending += count
+
+    def _release(self, count):
+        with self._slots:
+            self._pending -= count
+            self._slots.notify_all()
+
+    def _collect(self):
+        items = [self._queue.get()]
+        size = len(items[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    # Délai écoulé : on prend seulement ce qui attend déjà
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            items.append(item)
+            size += len(item[0])
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            # Ignorer les requêtes annulées entre-temps
+            running = []
+            for item in items:
+                if item[1].set_running_or_notify_cancel():
+                    running.append(item)
+                else:
+                    self._release(len(item[0]))
+            if not running:
+                continue
+            texts = [text for item_texts, _, _ in running for text in item_texts]
+            try:
+                results = self.predict_fn(texts)
+            except Exception as e:
+                for _, future, _ in running:
+                    future.set_exception(e)
+            else:
+                start = 0
+                for item_texts, future, single in running:
+                    chunk = results[start:start + len(item_texts)]
+                    start += len(item_texts)
+                    future.set_result(chunk[0] if single else list(chunk))
+            finally:
+                self._release(len(texts))
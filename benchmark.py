@@ -0,0 +1,350 @@
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from examples import example_datasets
+
+# Banc d'essai reproductible (commande `python cli.py bench`) : débit du
+# classifieur, latence de /predict sous charge, démarrage à froid et temps
+# de construction du tableau de bord. Tout tourne hors ligne sur CPU : le
+# modèle doit déjà être dans le cache local de Hugging Face.
+# Les résultats sont écrits en JSON ; `python cli.py bench-compare` compare
+# deux exécutions et signale les régressions.
+
+SUITES = ("throughput", "latency", "cold_start", "dashboard")
+
+# Sens d'amélioration d'une mesure, d'après le suffixe de son nom
+HIGHER_IS_BETTER = ("_per_s",)
+LOWER_IS_BETTER = ("_ms", "_s")
+
+DASHBOARD_LABELS = {
+    'sentiment_distribution': "sentiment_distribution",
+    'word_count_distribution': "word_count_distribution",
+    'confidence_evolution': "confidence_evolution",
+    'confidence': "confidence",
+    'sentiment_by_time': "sentiment_by_time",
+}
+
+
+# Modèle lu dans le cache local uniquement, sans requête vers le hub
+def offline():
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    rank = (len(values) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+def _latency_summary(seconds):
+    return {
+        "p50_ms": round(percentile(seconds, 50) * 1000, 3),
+        "p90_ms": round(percentile(seconds, 90) * 1000, 3),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 3),
+        "mean_ms": round(statistics.mean(seconds) * 1000, 3),
+    }
+
+
+# ---------- Corpus synthétique ----------
+
+# Textes multilingues d'environ `words` mots, obtenus en mélangeant les mots
+# des phrases d'exemple d'une même langue ; même graine = même corpus
+def synthetic_corpus(size, words=20, seed=0):
+    rng = random.Random(seed)
+    vocabulary = {
+        language: [word for text in texts for word in text.split()]
+        for language, texts in example_datasets.items()
+    }
+    languages = sorted(vocabulary)
+    corpus = []
+    for i in range(size):
+        pool = vocabulary[languages[i % len(languages)]]
+        corpus.append(" ".join(rng.choice(pool) for _ in range(words)))
+    return corpus
+
+
+# ---------- Débit du classifieur ----------
+
+def bench_throughput(batch_sizes=(1, 8, 32), lengths=(16, 64, 256), rounds=3, seed=0):
+    offline()
+    import model
+    pipe = model.load_model()
+    results = []
+    for words in lengths:
+        texts = synthetic_corpus(max(batch_sizes), words, seed)
+        tokens = statistics.mean(len(ids) for ids in pipe.tokenizer(texts, truncation=True)["input_ids"])
+        for batch_size in batch_sizes:
+            batch = texts[:batch_size]
+            model.classify_texts(batch)
+            timings = []
+            for _ in range(rounds):
+                start = time.perf_counter()
+                model.classify_texts(batch)
+                timings.append(time.perf_counter() - start)
+            best = min(timings)
+            results.append({
+                "name": f"bs={batch_size},words={words}",
+                "batch_size": batch_size,
+                "words": words,
+                "mean_tokens": round(tokens, 1),
+                "batch_ms": round(best * 1000, 3),
+                "texts_per_s": round(batch_size / best, 2),
+            })
+    return results
+
+
+# ---------- Latence de /predict sous charge ----------
+
+# Port libre pour un serveur de test (banc d'essai, autotune, tests)
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# Serveur uvicorn dans un thread du processus courant
+def _start_server(port):
+    import uvicorn
+    import api
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="error"))
+    thread = threading.Thread(target=server.run, daemon=True, name="bench-server")
+    thread.start()
+    return server, thread
+
+def _wait_ready(session, url, timeout=600):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if session.get(f"{url}/readyz", timeout=5).status_code == 200:
+                return
+        except Exception:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} n'est pas prêt après {timeout} s")
+
+# `concurrency` clients envoient `requests` requêtes au total. Chaque texte est
+# unique (numéro ajouté) pour ne mesurer que l'inférence, pas le cache.
+def bench_latency(concurrency=8, requests_count=400, words=20, url=None, seed=0):
+    offline()
+    import requests
+    server = None
+    if url is None:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        server, thread = _start_server(port)
+    texts = synthetic_corpus(requests_count, words, seed)
+    run_id = f"{time.time():.0f}"
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(requests_count))
+
+    def client():
+        session = requests.Session()
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                response = session.post(f"{url}/predict", json={"text": f"{texts[i]} {run_id}-{i}"}, timeout=60)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    try:
+        _wait_ready(requests.Session(), url)
+        start = time.perf_counter()
+        clients = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread_ in clients:
+            thread_.start()
+        for thread_ in clients:
+            thread_.join()
+        wall = time.perf_counter() - start
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join(timeout=10)
+
+    result = {
+        "name": f"concurrency={concurrency}",
+        "concurrency": concurrency,
+        "requests": requests_count,
+        "errors": errors[0],
+        "requests_per_s": round(len(latencies) / wall, 2),
+    }
+    if latencies:
+        result.update(_latency_summary(latencies))
+    return [result]
+
+
+# ---------- Démarrage à froid ----------
+
+# Exécuté dans un processus neuf : aucun module n'est encore importé
+COLD_START_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import model
+imported = time.perf_counter()
+model.load_model()
+loaded = time.perf_counter()
+model.classify_texts(["Premier texte analysé."])
+done = time.perf_counter()
+report = {"module_import_s": imported - start}
+report.update({f"{name}_s": seconds for name, seconds in model.status["phases"].items()})
+report.update(first_prediction_s=done - loaded, total_s=done - start)
+print(json.dumps(report))
+"""
+
+def bench_cold_start(repeats=3):
+    offline()
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_START_SCRIPT],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True, capture_output=True, text=True
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return [{
+        "name": "import_to_first_prediction",
+        "repeats": repeats,
+        **{phase: round(statistics.median(run[phase] for run in runs), 3) for phase in runs[0]},
+    }]
+
+
+# ---------- Tableau de bord ----------
+
+# Historique synthétique réparti sur `days` jours
+def _fill_history(store, size, days=90, seed=0):
+    rng = random.Random(seed)
+    texts = synthetic_corpus(min(size, 1000), 20, seed)
+    start = datetime(2024, 1, 1)
+    items = []
+    for i in range(size):
+        weights = [rng.random() for _ in range(5)]
+        probs = [weight / sum(weights) for weight in weights]
+        stars = probs.index(max(probs)) + 1
+        text = texts[i % len(texts)]
+        items.append({
+            'timestamp': (start + timedelta(seconds=rng.randrange(days * 86400))).strftime("%Y-%m-%d %H:%M:%S"),
+            'text': text,
+            'label': "POSITIVE" if stars >= 4 else "NEGATIVE",
+            'score': max(probs),
+            'stars': stars,
+            'probs': probs,
+            'word_count': len(text.split()),
+        })
+        if len(items) >= 10000:
+            store.append_many(items)
+            items = []
+    store.append_many(items)
+    store.flush()
+
+# Temps de construction des figures et du tableau récent, sans le cache Streamlit
+def bench_dashboard(sizes=(1000, 10000, 100000), rounds=3, seed=0):
+    import dashboard
+    from history import HistoryStore
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            store = HistoryStore(os.path.join(directory, "history.db"), flush_size=10 ** 9, flush_interval=3600)
+            _fill_history(store, size, seed=seed)
+            timings = []
+            for _ in range(rounds):
+                start = time.perf_counter()
+                dashboard.build_figures(store, DASHBOARD_LABELS)
+                store.query(limit=10)
+                timings.append(time.perf_counter() - start)
+            store.close()
+        results.append({
+            "name": f"history={size}",
+            "history_size": size,
+            "render_ms": round(min(timings) * 1000, 3),
+        })
+    return results
+
+
+# ---------- Exécution et comparaison ----------
+
+def environment():
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+    }
+    try:
+        import torch
+        import model
+        info.update(torch=torch.__version__, torch_threads=torch.get_num_threads(), model=model.MODEL_ID)
+    except ImportError:
+        pass
+    return info
+
+def run(suites=SUITES, seed=0, **options):
+    runners = {
+        "throughput": lambda: bench_throughput(
+            options.get("batch_sizes", (1, 8, 32)), options.get("lengths", (16, 64, 256)),
+            options.get("rounds", 3), seed
+        ),
+        "latency": lambda: bench_latency(
+            options.get("concurrency", 8), options.get("requests", 400), url=options.get("url"), seed=seed
+        ),
+        "cold_start": lambda: bench_cold_start(options.get("repeats", 3)),
+        "dashboard": lambda: bench_dashboard(
+            options.get("history_sizes", (1000, 10000, 100000)), options.get("rounds", 3), seed
+        ),
+    }
+    results = {}
+    for suite in suites:
+        print(f"[bench] {suite}...", file=sys.stderr)
+        results[suite] = runners[suite]()
+    return {"environment": environment(), "seed": seed, "results": results}
+
+# Mesures à plat : "suite/cas/mesure" -> valeur
+def flatten(report):
+    values = {}
+    for suite, cases in report["results"].items():
+        for case in cases:
+            for metric, value in case.items():
+                if isinstance(value, (int, float)) and metric.endswith(HIGHER_IS_BETTER + LOWER_IS_BETTER):
+                    values[f"{suite}/{case['name']}/{metric}"] = value
+    return values
+
+# Écart relatif par mesure commune ; une régression est une dégradation
+# supérieure à `tolerance` (0.1 = 10 %) dans le mauvais sens
+def compare(baseline, candidate, tolerance=0.1):
+    before, after = flatten(baseline), flatten(candidate)
+    rows = []
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        change = (new - old) / old if old else 0.0
+        worse = -change if key.endswith(HIGHER_IS_BETTER) else change
+        rows.append({
+            "metric": key,
+            "baseline": old,
+            "candidate": new,
+            "change": round(change, 4),
+            "regression": worse > tolerance,
+        })
+    return rows
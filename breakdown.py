@@ -0,0 +1,32 @@
+from sentences import split_sentences
+
+# Analyse phrase par phrase de plusieurs documents en un seul passage :
+# documents et phrases sont dédupliqués, triés par longueur puis envoyés
+# ensemble au classifieur par paquets, si bien que les groupes de longueurs
+# voisines (voir bucketing.py) mélangent les phrases de tous les documents.
+# Le surcoût suit le nombre total de tokens, pas le nombre de phrases.
+
+
+def breakdown_documents(documents, classify, language=None, chunk_size=64):
+    spans = [split_sentences(document, language) for document in documents]
+    unique = {}
+    for document, document_spans in zip(documents, spans):
+        unique.setdefault(document, None)
+        for start, end in document_spans:
+            unique.setdefault(document[start:end], None)
+
+    texts = sorted((text for text in unique if text.strip()), key=len)
+    for offset in range(0, len(texts), chunk_size):
+        chunk = texts[offset:offset + chunk_size]
+        for text, prediction in zip(chunk, classify(chunk)):
+            unique[text] = prediction
+
+    results = []
+    for document, document_spans in zip(documents, spans):
+        result = dict(unique[document] or {"label": None, "score": None, "stars": None, "probs": None})
+        result["sentences"] = [
+            dict(unique[document[start:end]], start=start, end=end, text=document[start:end])
+            for start, end in document_spans
+        ]
+        results.append(result)
+    return results
@@ -0,0 +1,81 @@
+import os
+import threading
+
+# Efficacité de padding minimale d'un lot (tokens réels / tokens calculés) :
+# en dessous, le lot est coupé en deux. 0 = un seul lot par appel.
+BUCKET_MIN_EFFICIENCY = float(os.environ.get("BUCKET_MIN_EFFICIENCY", "0.75"))
+
+
+# Trie les textes par longueur puis les regroupe en lots de longueurs
+# voisines : un tweet n'est plus paddé à la taille d'un long avis.
+# Renvoie des listes d'indices dans l'ordre d'origine des entrées.
+def bucket_by_length(lengths, max_batch_size, min_efficiency=BUCKET_MIN_EFFICIENCY):
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    buckets = []
+    current = []
+    total = 0
+    for i in order:
+        length = max(1, lengths[i])
+        if current:
+            count = len(current) + 1
+            # Triés par ordre croissant : length est la longueur maximale du lot
+            if count > max_batch_size or total + length < min_efficiency * count * length:
+                buckets.append(current)
+                current = []
+                total = 0
+        current.append(i)
+        total += length
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+# Compteurs de padding ; drain()/merge() permettent de remonter les
+# compteurs des processus d'inférence vers le processus principal
+class PaddingStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.real_tokens = 0
+        self.padded_tokens = 0
+        self.batches = 0
+
+    def record(self, lengths):
+        if not lengths:
+            return
+        with self._lock:
+            self.real_tokens += sum(lengths)
+            self.padded_tokens += max(lengths) * len(lengths)
+            self.batches += 1
+
+    def merge(self, counts):
+        with self._lock:
+            self.real_tokens += counts["real_tokens"]
+            self.padded_tokens += counts["padded_tokens"]
+            self.batches += counts["batches"]
+
+    def drain(self):
+        with self._lock:
+            counts = {
+                "real_tokens": self.real_tokens,
+                "padded_tokens": self.padded_tokens,
+                "batches": self.batches,
+            }
+            self.real_tokens = self.padded_tokens = self.batches = 0
+        return counts
+
+    # Dans un processus créé par fork : verrou neuf, compteurs hérités oubliés
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+        self.real_tokens = self.padded_tokens = self.batches = 0
+
+    def report(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "real_tokens": self.real_tokens,
+                "padded_tokens": self.padded_tokens,
+                "padding_efficiency": self.real_tokens / self.padded_tokens if self.padded_tokens else 1.0,
+            }
+
+
+padding_stats = PaddingStats()
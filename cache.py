@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# Écritures différées du niveau SQLite (voir PredictionCache)
+CACHE_FLUSH_SIZE = int(os.environ.get("CACHE_FLUSH_SIZE", "256"))
+CACHE_FLUSH_INTERVAL = float(os.environ.get("CACHE_FLUSH_INTERVAL", "1.0"))
+# Paramètres par requête SQLite (limite par défaut des anciennes versions : 999)
+SQLITE_MAX_PARAMS = 900
+
+
+# Le modèle est "uncased" : casse et espaces multiples ne changent pas la prédiction
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFC", text).lower().split())
+
+def cache_key(text, model_id):
+    payload = f"{model_id}\0{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+# Cache des prédictions : LRU borné en mémoire + niveau SQLite optionnel
+# qui survit aux redémarrages. Les écritures sur disque sont différées : un
+# thread les regroupe (une transaction, un executemany) toutes les
+# `flush_interval` secondes ou dès `flush_size` entrées en attente, si bien
+# que put() ne touche jamais le disque.
+class PredictionCache:
+    def __init__(self, model_id, max_size=10000, path=None, flush_size=CACHE_FLUSH_SIZE,
+                 flush_interval=CACHE_FLUSH_INTERVAL):
+        self.model_id = model_id
+        self.max_size = max_size
+        self.path = path
+        self.flush_size = flush_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._db = None
+        # Entrées pas encore écrites sur disque (clé -> prédiction)
+        self._unwritten = {}
+        self._wakeup = threading.Event()
+        self._closed = threading.Event()
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self._db.commit()
+            self._writer = threading.Thread(
+                target=self._flush_periodically, args=(flush_interval,), daemon=True, name="cache-flush"
+            )
+            self._writer.start()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 or self._db is not None
+
+    # Une lecture peut toucher le disque : à appeler hors de la boucle d'événements
+    @property
+    def persistent(self):
+        return self._db is not None
+
+    def get(self, text):
+        return self.get_many([text])[0]
+
+    # Mémoire d'abord, puis une seule requête SQLite pour les textes restants
+    def get_many(self, texts):
+        if not self.enabled:
+            return [None] * len(texts)
+        keys = [cache_key(text, self.model_id) for text in texts]
+        found = [None] * len(texts)
+        with self._lock:
+            missing = []
+            for i, key in enumerate(keys):
+                value = self._entries.get(key) or self._unwritten.get(key)
+                if value is not None:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                    self.hits += 1
+                    found[i] = dict(value)
+                else:
+                    missing.append(i)
+            if missing and self._db is not None:
+                wanted = list({keys[i] for i in missing})
+                rows = {}
+                for start in range(0, len(wanted), SQLITE_MAX_PARAMS):
+                    part = wanted[start:start + SQLITE_MAX_PARAMS]
+                    rows.update(self._db.execute(
+                        f"SELECT key, value FROM predictions WHERE key IN ({', '.join('?' * len(part))})", part
+                    ).fetchall())
+                still_missing = []
+                for i in missing:
+                    row = rows.get(keys[i])
+                    if row is None:
+                        still_missing.append(i)
+                        continue
+                    value = json.loads(row)
+                    self._remember(keys[i], value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    found[i] = dict(value)
+                missing = still_missing
+            self.misses += len(missing)
+        return found
+
+    def put(self, text, prediction, model_id=None):
+        self.put_many([text], [prediction], model_id)
+
+    # `model_id` : modèle qui a calculé les prédictions, s'il a pu changer depuis
+    def put_many(self, texts, predictions, model_id=None):
+        if not self.enabled:
+            return
+        model_id = model_id or self.model_id
+        with self._lock:
+            for text, prediction in zip(texts, predictions):
+                key = cache_key(text, model_id)
+                value = dict(prediction)
+                self._remember(key, value)
+                if self._db is not None:
+                    self._unwritten[key] = value
+            if len(self._unwritten) >= self.flush_size:
+                self._wakeup.set()
+
+    # Entrées en attente écrites dans une seule transaction
+    def flush(self):
+        with self._lock:
+            if self._db is None or not self._unwritten:
+                return
+            rows = [(key, json.dumps(value)) for key, value in self._unwritten.items()]
+            with self._db:
+                self._db.executemany("INSERT OR REPLACE INTO predictions (key, value) VALUES (?, ?)", rows)
+            self._unwritten = {}
+
+    def _flush_periodically(self, interval):
+        while not self._closed.is_set():
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        self._closed.set()
+        self._wakeup.set()
+        self.flush()
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, key, value):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._unwritten = {}
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "model": self.model_id,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+            if self._db is not None:
+                stats["disk_path"] = self.path
+                stats["disk_size"] = self._db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+            return stats
+
+
+# IDs de tokens des textes récents (voie rapide, voir fastpath.py) : un texte
+# déjà vu n'est pas retokenisé. LRU borné en nombre de textes.
+class TokenCache:
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, texts):
+        found = []
+        with self._lock:
+            for text in texts:
+                ids = self._entries.get(text) if self.max_size > 0 else None
+                if ids is not None:
+                    self._entries.move_to_end(text)
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                found.append(ids)
+        return found
+
+    def put_many(self, texts, encoded):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            for text, ids in zip(texts, encoded):
+                self._entries[text] = tuple(ids)
+                self._entries.move_to_end(text)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # Compteurs des processus d'inférence, agrégés dans le processus principal
+    def merge(self, counts):
+        with self._lock:
+            self.hits += counts["hits"]
+            self.misses += counts["misses"]
+
+    def drain(self):
+        with self._lock:
+            counts = {"hits": self.hits, "misses": self.misses}
+            self.hits = self.misses = 0
+        return counts
+
+    # Dans un processus créé par fork : verrou neuf, compteurs hérités oubliés
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
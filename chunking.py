@@ -0,0 +1,91 @@
+import torch
+
+import bucketing
+import metrics
+from model import grad_context
+
+AGGREGATIONS = ("mean", "weighted", "max")
+
+
+# Fenêtres glissantes de `window` tokens, décalées de `stride` tokens.
+# La dernière fenêtre est alignée sur la fin du texte ; au-delà de
+# max_windows, on garde des fenêtres réparties régulièrement pour que
+# le coût reste borné quelle que soit la longueur.
+def split_windows(ids, window, stride, max_windows=0):
+    if len(ids) <= window:
+        return [ids]
+    starts = list(range(0, len(ids) - window, max(1, stride))) + [len(ids) - window]
+    if max_windows and len(starts) > max_windows:
+        if max_windows == 1:
+            starts = starts[:1]
+        else:
+            step = (len(starts) - 1) / (max_windows - 1)
+            starts = [starts[round(i * step)] for i in range(max_windows)]
+    return [ids[start:start + window] for start in starts]
+
+# Combine les probabilités des fenêtres d'un document :
+# mean = moyenne simple, weighted = pondérée par le nombre de tokens,
+# max = fenêtre la plus confiante
+def aggregate(probs, lengths, method):
+    if method == "max":
+        return probs[probs.max(dim=1).values.argmax()]
+    if method == "weighted":
+        weights = torch.tensor(lengths, dtype=probs.dtype)
+        return (probs * weights[:, None]).sum(dim=0) / weights.sum()
+    return probs.mean(dim=0)
+
+def max_window_tokens(pipe):
+    tokenizer = pipe.tokenizer
+    limit = min(tokenizer.model_max_length, pipe.model.config.max_position_embeddings)
+    return limit - tokenizer.num_special_tokens_to_add()
+
+def encode_windows(tokenizer, windows):
+    batch = tokenizer.pad({"input_ids": windows}, return_tensors="pt")
+    if "token_type_ids" in tokenizer.model_input_names and "token_type_ids" not in batch:
+        batch["token_type_ids"] = torch.zeros_like(batch["input_ids"])
+    return batch
+
+# Tokenise une seule fois, découpe chaque texte en fenêtres, passe toutes les
+# fenêtres de tous les textes dans le modèle par lots d'au plus batch_size
+# fenêtres de longueurs voisines, puis
+# agrège par texte. Renvoie les probabilités des étoiles (tableau textes x 5).
+def classify_long_texts(pipe, texts, aggregation="mean", stride=384, max_windows=32, batch_size=32):
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Agrégation inconnue : {aggregation} (choix : {', '.join(AGGREGATIONS)})")
+    tokenizer = pipe.tokenizer
+    window = max_window_tokens(pipe)
+    with metrics.STAGE_LATENCY.time(stage="tokenize"):
+        encoded = tokenizer(list(texts), add_special_tokens=False, truncation=False)["input_ids"]
+        windows, owners, lengths = [], [], []
+        for doc, ids in enumerate(encoded):
+            for chunk in split_windows(ids, window, stride, max_windows):
+                windows.append(tokenizer.build_inputs_with_special_tokens(chunk))
+                owners.append(doc)
+                lengths.append(len(chunk))
+
+    # Fenêtres regroupées par longueur, probabilités remises à leur place
+    probs = torch.empty(len(windows), pipe.model.config.num_labels)
+    window_lengths = [len(ids) for ids in windows]
+    with grad_context():
+        for bucket in bucketing.bucket_by_length(window_lengths, batch_size):
+            with metrics.STAGE_LATENCY.time(stage="tokenize"):
+                batch = encode_windows(tokenizer, [windows[i] for i in bucket])
+            with metrics.STAGE_LATENCY.time(stage="forward"):
+                logits = pipe.model(**batch).logits
+            probs[bucket] = torch.softmax(logits.float(), dim=-1)
+            bucketing.padding_stats.record([window_lengths[i] for i in bucket])
+
+    with metrics.STAGE_LATENCY.time(stage="postprocess"):
+        return aggregate_documents(probs, owners, lengths, len(encoded), aggregation).numpy()
+
+# Les fenêtres d'un même texte sont contiguës dans owners
+def aggregate_documents(probs, owners, lengths, documents, aggregation):
+    results = []
+    start = 0
+    for doc in range(documents):
+        end = start
+        while end < len(owners) and owners[end] == doc:
+            end += 1
+        results.append(aggregate(probs[start:end], lengths[start:end], aggregation))
+        start = end
+    return torch.stack(results)
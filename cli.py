@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import sys
+
+
+# Les réglages sont lus par api.py à l'import : on les place dans
+# l'environnement avant de l'importer
+def serve(args):
+    os.environ["INFERENCE_PROCESSES"] = str(args.processes)
+    if args.threads is not None:
+        os.environ["INFERENCE_THREADS"] = str(args.threads)
+    import uvicorn
+    import api
+    # Le modèle est chargé en arrière-plan une fois le port ouvert (voir /readyz)
+    try:
+        uvicorn.run(api.app, host=args.host, port=args.port, log_level=args.log_level)
+    finally:
+        if api.pool is not None:
+            api.pool.close()
+
+
+def export(args):
+    import backends
+    from model import MODEL_NAME
+    target = backends.export(args.backend, MODEL_NAME)
+    print(target or f"{args.backend} : rien à convertir")
+
+
+# Accord des étoiles entre un backend et le modèle fp32 sur les phrases d'exemple
+def parity(args):
+    os.environ["MODEL_BACKEND"] = "torch-fp32"
+    import backends
+    import model
+    from examples import sample_texts
+    model.load_model()
+    candidate = backends.load_classifier(args.backend, model.MODEL_NAME)
+    report = backends.parity_report(
+        lambda texts: model.classify_texts(texts, pipe=candidate),
+        model.classify_texts,
+        sample_texts()
+    )
+    report["backend"] = args.backend
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if report["star_agreement"] < args.min_agreement:
+        sys.exit(1)
+
+
+# Analyse hors ligne d'un fichier JSONL, CSV ou Parquet (voir scoring.py)
+def score(args):
+    import scoring
+    report = scoring.score_file(
+        args.input, args.output,
+        column=args.column,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        mode=args.mode,
+        threads=args.threads,
+        prefetch=args.prefetch,
+        checkpoint_rows=args.checkpoint_rows
+    )
+    report["output"] = args.output
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+# Élève distillé depuis le modèle servi (voir distill.py) ; code de sortie 1
+# si l'accord POSITIVE/NEGATIVE est sous le minimum demandé
+def distill(args):
+    import distill as distillation
+    report = distillation.distill(
+        args.corpus,
+        column=args.column,
+        layers=args.layers,
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        learning_rate=args.learning_rate,
+        temperature=args.temperature,
+        eval_fraction=args.eval_fraction,
+        limit=args.limit,
+        seed=args.seed
+    )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if report["agreement"]["binary_agreement"] < args.min_agreement:
+        sys.exit(1)
+
+
+def _ints(value):
+    return tuple(int(v) for v in value.split(",") if v.strip())
+
+def bench(args):
+    import benchmark
+    report = benchmark.run(
+        args.suites.split(","),
+        seed=args.seed,
+        batch_sizes=_ints(args.batch_sizes),
+        lengths=_ints(args.lengths),
+        rounds=args.rounds,
+        concurrency=args.concurrency,
+        requests=args.requests,
+        url=args.url,
+        repeats=args.repeats,
+        history_sizes=_ints(args.history_sizes)
+    )
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report["results"], ensure_ascii=False, indent=2))
+
+
+# Meilleurs threads, tailles de lot, attente et mode d'inférence pour cette
+# machine, écrits dans le profil chargé au démarrage (voir autotune.py)
+def autotune(args):
+    import autotune as tuner
+    profile = tuner.autotune(
+        args.output,
+        corpus=args.corpus,
+        column=args.column,
+        samples=args.samples,
+        threads=_ints(args.threads) or None,
+        interop=_ints(args.interop_threads) or None,
+        batch_sizes=_ints(args.batch_sizes),
+        max_waits=_ints(args.max_wait_ms),
+        rounds=args.rounds,
+        concurrency=args.concurrency,
+        requests_count=args.requests,
+        slack=args.latency_slack,
+        latency=not args.skip_latency,
+        seed=args.seed
+    )
+    print(json.dumps(profile["settings"], ensure_ascii=False, indent=2))
+    print(f"Profil écrit dans {args.output}", file=sys.stderr)
+
+
+# Code de sortie 1 si une mesure s'est dégradée au-delà de la tolérance
+def bench_compare(args):
+    import benchmark
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+    rows = benchmark.compare(baseline, candidate, args.tolerance)
+    for row in rows:
+        flag = "RÉGRESSION" if row["regression"] else ""
+        print(f"{row['metric']:<60} {row['baseline']:>12} {row['candidate']:>12} {row['change']:>+8.1%} {flag}")
+    if any(row["regression"] for row in rows):
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="cli", description="Analyseur de sentiment en ligne de commande")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="lancer l'API FastAPI sans l'interface Streamlit")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument(
+        "--processes", type=int, default=int(os.environ.get("INFERENCE_PROCESSES", "0")),
+        help="nombre de processus d'inférence partageant les poids (0 = threads dans le processus)"
+    )
+    serve_parser.add_argument("--threads", type=int, default=None, help="threads torch par processus")
+    serve_parser.add_argument("--log-level", default="info")
+    serve_parser.set_defaults(func=serve)
+
+    from backends import BACKENDS
+    export_parser = commands.add_parser("export", help="convertir et mettre en cache le modèle d'un backend")
+    export_parser.add_argument("--backend", choices=BACKENDS, required=True)
+    export_parser.set_defaults(func=export)
+
+    parity_parser = commands.add_parser("parity", help="comparer un backend au modèle fp32")
+    parity_parser.add_argument("--backend", choices=BACKENDS, required=True)
+    parity_parser.add_argument(
+        "--min-agreement", type=float, default=0.9,
+        help="accord minimal sur les étoiles, sinon code de sortie 1"
+    )
+    parity_parser.set_defaults(func=parity)
+
+    score_parser = commands.add_parser("score", help="analyser un fichier JSONL, CSV ou Parquet hors ligne")
+    score_parser.add_argument("input")
+    score_parser.add_argument("-o", "--output", required=True, help="fichier de sortie (.jsonl, .csv ou .parquet)")
+    score_parser.add_argument("--column", default="text", help="colonne contenant le texte")
+    score_parser.add_argument("--batch-size", type=int, default=64)
+    score_parser.add_argument("--workers", type=int, default=1, help="threads ou processus d'inférence")
+    score_parser.add_argument("--mode", choices=("threads", "processes"), default="threads")
+    score_parser.add_argument("--threads", type=int, default=None, help="threads torch par worker")
+    score_parser.add_argument("--prefetch", type=int, default=4, help="paquets lus en avance")
+    score_parser.add_argument(
+        "--checkpoint-rows", type=int, default=10000,
+        help="lignes par segment écrit ; une reprise repart du dernier segment"
+    )
+    score_parser.set_defaults(func=score)
+
+    distill_parser = commands.add_parser("distill", help="entraîner un modèle élève plus léger sur un corpus local")
+    distill_parser.add_argument("corpus", help="fichier JSONL, CSV ou Parquet (colonnes prob_*_star réutilisées si présentes)")
+    distill_parser.add_argument("--column", default="text", help="colonne contenant le texte")
+    distill_parser.add_argument("--layers", type=int, default=None, help="couches du professeur gardées par l'élève (DISTILL_LAYERS)")
+    distill_parser.add_argument("--epochs", type=int, default=3)
+    distill_parser.add_argument("--batch-size", type=int, default=32)
+    distill_parser.add_argument("--learning-rate", type=float, default=5e-5)
+    distill_parser.add_argument("--temperature", type=float, default=2.0)
+    distill_parser.add_argument("--eval-fraction", type=float, default=0.1, help="part du corpus mise de côté pour l'accord")
+    distill_parser.add_argument("--limit", type=int, default=None, help="textes lus au maximum")
+    distill_parser.add_argument("--seed", type=int, default=0)
+    distill_parser.add_argument(
+        "--min-agreement", type=float, default=0.9,
+        help="accord POSITIVE/NEGATIVE minimal avec le professeur, sinon code de sortie 1"
+    )
+    distill_parser.set_defaults(func=distill)
+
+    bench_parser = commands.add_parser("bench", help="mesurer débit, latence, démarrage et tableau de bord")
+    bench_parser.add_argument("-o", "--output", default="bench.json")
+    bench_parser.add_argument("--suites", default="throughput,latency,cold_start,dashboard")
+    bench_parser.add_argument("--seed", type=int, default=0)
+    bench_parser.add_argument("--batch-sizes", default="1,8,32")
+    bench_parser.add_argument("--lengths", default="16,64,256", help="longueurs des textes en mots")
+    bench_parser.add_argument("--rounds", type=int, default=3)
+    bench_parser.add_argument("--concurrency", type=int, default=8, help="clients simultanés sur /predict")
+    bench_parser.add_argument("--requests", type=int, default=400)
+    bench_parser.add_argument("--url", default=None, help="API déjà lancée (sinon un serveur local est démarré)")
+    bench_parser.add_argument("--repeats", type=int, default=3, help="démarrages à froid mesurés")
+    bench_parser.add_argument("--history-sizes", default="1000,10000,100000")
+    bench_parser.set_defaults(func=bench)
+
+    compare_parser = commands.add_parser("bench-compare", help="comparer deux résultats de bench")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--tolerance", type=float, default=0.1, help="dégradation relative tolérée")
+    compare_parser.set_defaults(func=bench_compare)
+
+    import tuning
+    autotune_parser = commands.add_parser("autotune", help="chercher les meilleurs réglages d'inférence pour cette machine")
+    autotune_parser.add_argument("-o", "--output", default=tuning.TUNING_PROFILE, help="profil écrit (TUNING_PROFILE)")
+    autotune_parser.add_argument("--corpus", default=None, help="textes représentatifs (JSONL, CSV ou Parquet) ; sinon synthétiques")
+    autotune_parser.add_argument("--column", default="text")
+    autotune_parser.add_argument("--samples", type=int, default=256)
+    autotune_parser.add_argument("--threads", default="", help="threads intra-op essayés (défaut : puissances de 2 jusqu'au nombre de cœurs)")
+    autotune_parser.add_argument("--interop-threads", default="", help="threads inter-op essayés (défaut : 1,2,4)")
+    autotune_parser.add_argument("--batch-sizes", default="1,8,16,32,64")
+    autotune_parser.add_argument("--max-wait-ms", default="0,2,5,10,20", help="valeurs de BATCH_MAX_WAIT_MS essayées sous charge")
+    autotune_parser.add_argument("--rounds", type=int, default=5)
+    autotune_parser.add_argument("--concurrency", type=int, default=16, help="clients simultanés sur /predict")
+    autotune_parser.add_argument("--requests", type=int, default=400)
+    autotune_parser.add_argument(
+        "--latency-slack", type=float, default=0.2,
+        help="p99 toléré au-dessus du meilleur pour gagner du débit (0.2 = 20 %%)"
+    )
+    autotune_parser.add_argument("--skip-latency", action="store_true", help="ne pas mesurer BATCH_MAX_WAIT_MS sous charge")
+    autotune_parser.add_argument("--seed", type=int, default=0)
+    autotune_parser.set_defaults(func=autotune)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import os
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+# API distante : si SENTIMENT_API_URL est défini, l'interface l'appelle en HTTP
+# (sessions keep-alive) ; sinon elle appelle le service d'inférence dans son
+# propre processus, sans passer par le réseau local
+SENTIMENT_API_URL = os.environ.get("SENTIMENT_API_URL", "")
+API_TIMEOUT = float(os.environ.get("API_TIMEOUT", "10"))
+API_RETRIES = int(os.environ.get("API_RETRIES", "2"))
+API_POOL_SIZE = int(os.environ.get("API_POOL_SIZE", "10"))
+
+
+class ServiceError(Exception):
+    pass
+
+# Modèle en cours de chargement ou file d'inférence pleine
+class ServiceUnavailable(ServiceError):
+    pass
+
+class ServiceTimeout(ServiceError):
+    pass
+
+class ServiceUnreachable(ServiceError):
+    pass
+
+
+# Appels directs au service d'inférence partagé (cache, batcher, modèle)
+class InProcessClient:
+    def __init__(self, timeout=API_TIMEOUT):
+        import api
+        self.api = api
+        self.timeout = timeout
+        api.start_model_loading()
+
+    def predict(self, text):
+        from batching import QueueFullError
+        from model import ModelNotReadyError
+        try:
+            prediction, future = self.api.submit_text(text)
+        except (ModelNotReadyError, QueueFullError) as e:
+            raise ServiceUnavailable(str(e))
+        if future is not None:
+            try:
+                prediction = future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                raise ServiceTimeout(f"pas de réponse après {self.timeout} s")
+            except Exception as e:
+                raise ServiceError(str(e))
+        return prediction
+
+    # Traitement en masse : paquets de BATCH_CHUNK_SIZE textes envoyés à
+    # l'exécuteur, qui attend une place plutôt que de refuser
+    def predict_many(self, texts):
+        from model import is_ready
+        if not is_ready():
+            raise ServiceUnavailable("modèle en cours de chargement")
+        size = self.api.BATCH_CHUNK_SIZE
+        predictions = []
+        try:
+            for start in range(0, len(texts), size):
+                predictions.extend(self.api.classify_with_cache(texts[start:start + size]))
+        except Exception as e:
+            raise ServiceError(str(e))
+        return predictions
+
+    # Détail par phrase de plusieurs documents (voir breakdown.py)
+    def predict_breakdown(self, texts, language=None):
+        from model import is_ready
+        if not is_ready():
+            raise ServiceUnavailable("modèle en cours de chargement")
+        try:
+            return self.api.breakdown(list(texts), language)
+        except Exception as e:
+            raise ServiceError(str(e))
+
+
+# Client HTTP avec pool de connexions keep-alive et nouvelles tentatives
+# sur les erreurs réseau et les passerelles indisponibles
+class HttpClient:
+    def __init__(self, base_url, timeout=API_TIMEOUT, retries=API_RETRIES, pool_size=API_POOL_SIZE):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.2,
+            status_forcelist=(502, 504),
+            allowed_methods=frozenset(["GET", "POST"]),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def predict(self, text):
+        import requests
+        try:
+            response = self.session.post(f"{self.base_url}/predict", json={"text": text}, timeout=self.timeout)
+        except requests.exceptions.Timeout as e:
+            raise ServiceTimeout(str(e))
+        except requests.exceptions.ConnectionError as e:
+            raise ServiceUnreachable(str(e))
+        self._check(response)
+        return response.json()
+
+    # Résultats NDJSON de /predict_batch lus au fil de l'eau, remis dans l'ordre
+    def predict_many(self, texts):
+        import json
+        import requests
+        try:
+            response = self.session.post(
+                f"{self.base_url}/predict_batch", json={"texts": list(texts)}, timeout=self.timeout, stream=True
+            )
+            self._check(response)
+            predictions = [None] * len(texts)
+            for line in response.iter_lines():
+                if line:
+                    result = json.loads(line)
+                    index = result.pop("index")
+                    if "error" in result:
+                        raise ServiceError(f"texte {index} : {result['error']}")
+                    predictions[index] = result
+        except requests.exceptions.Timeout as e:
+            raise ServiceTimeout(str(e))
+        except requests.exceptions.ConnectionError as e:
+            raise ServiceUnreachable(str(e))
+        except (requests.exceptions.ChunkedEncodingError, ValueError, IndexError, KeyError) as e:
+            raise ServiceError(f"réponse NDJSON invalide : {e!r}")
+        # Flux interrompu : des textes sans résultat
+        received = sum(prediction is not None for prediction in predictions)
+        if received != len(texts):
+            raise ServiceError(f"réponse incomplète : {received} résultats sur {len(texts)}")
+        return predictions
+
+    def predict_breakdown(self, texts, language=None):
+        import requests
+        try:
+            response = self.session.post(
+                f"{self.base_url}/predict_breakdown",
+                json={"texts": list(texts), "language": language},
+                timeout=self.timeout
+            )
+        except requests.exceptions.Timeout as e:
+            raise ServiceTimeout(str(e))
+        except requests.exceptions.ConnectionError as e:
+            raise ServiceUnreachable(str(e))
+        self._check(response)
+        return response.json()
+
+    def _check(self, response):
+        if response.status_code == 503:
+            raise ServiceUnavailable(response.json().get("detail", ""))
+        if response.status_code != 200:
+            raise ServiceError(f"HTTP {response.status_code}")
+
+
+def make_client():
+    if SENTIMENT_API_URL:
+        return HttpClient(SENTIMENT_API_URL)
+    return InProcessClient()
@@ -0,0 +1,150 @@
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from history import WORD_COUNT_BIN
+
+# Figures du tableau de bord, construites à partir des agrégats de
+# l'historique (voir history.py). Sans dépendance à Streamlit : app.py les
+# met en cache, benchmark.py mesure leur temps de construction.
+
+# Points maximaux de la courbe de confiance, quelle que soit la taille de l'historique
+CHART_POINTS = 300
+SENTIMENT_COLORS = {'POSITIVE': '#10b981', 'NEUTRAL': '#f59e0b', 'NEGATIVE': '#ef4444'}
+BAND_COLORS = {
+    'POSITIVE': 'rgba(16, 185, 129, 0.2)',
+    'NEUTRAL': 'rgba(245, 158, 11, 0.2)',
+    'NEGATIVE': 'rgba(239, 68, 68, 0.2)',
+}
+
+def style_figure(fig, **layout):
+    fig.update_layout(
+        plot_bgcolor='rgba(255, 255, 255, 0.95)',
+        paper_bgcolor='rgba(255, 255, 255, 0.95)',
+        **layout
+    )
+    return fig
+
+# Courbe de confiance sous-échantillonnée : moyenne par classe d'analyses
+# consécutives, avec une bande min/max
+def build_confidence_figure(series, title, y_title):
+    fig = go.Figure()
+    for label in SENTIMENT_COLORS:
+        points = [point for point in series if point['label'] == label]
+        if not points:
+            continue
+        x = [point['index'] for point in points]
+        fig.add_trace(go.Scatter(
+            x=x, y=[point['max'] for point in points],
+            mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'
+        ))
+        fig.add_trace(go.Scatter(
+            x=x, y=[point['min'] for point in points],
+            mode='lines', line=dict(width=0), fill='tonexty',
+            fillcolor=BAND_COLORS[label], showlegend=False, hoverinfo='skip'
+        ))
+        fig.add_trace(go.Scatter(
+            x=x, y=[point['mean'] for point in points],
+            mode='lines+markers', name=label, line=dict(color=SENTIMENT_COLORS[label])
+        ))
+    return style_figure(fig, title=title, xaxis_title="Analyse #", yaxis_title=y_title)
+
+# ---------- Autre politique de décision ----------
+# Les agrégats de l'historique portent les étiquettes calculées par le serveur.
+# Pour une autre politique, les probabilités stockées de la période sont
+# relues et réétiquetées en NumPy (voir policy.py), sans repasser par le modèle.
+
+def relabel(store, start_day, end_day, policy_name, negative, positive):
+    import policy
+    arrays = store.policy_arrays(start_day, end_day)
+    arrays['label'] = policy.classify(arrays['probs'], policy_name, negative, positive)
+    arrays['score'] = arrays['probs'].max(axis=1)
+    return arrays
+
+def relabeled_summary(arrays):
+    labels = arrays['label']
+    total = len(labels)
+    return {
+        "total": total,
+        "positive": int((labels == "POSITIVE").sum()),
+        "negative": int((labels == "NEGATIVE").sum()),
+        "neutral": int((labels == "NEUTRAL").sum()),
+        "avg_score": float(arrays['score'].mean()) if total else 0.0,
+    }
+
+def relabeled_word_counts(arrays):
+    frame = pd.DataFrame({
+        'word_count': arrays['word_count'] // WORD_COUNT_BIN * WORD_COUNT_BIN,
+        'label': arrays['label'],
+    })
+    return frame.groupby(['word_count', 'label']).size().reset_index(name='count').to_dict('records')
+
+def relabeled_hourly_counts(arrays):
+    frame = pd.DataFrame({'hour': arrays['hour'], 'label': arrays['label']})
+    return frame.groupby(['hour', 'label']).size().reset_index(name='count').to_dict('records')
+
+
+# Toutes les figures de la période ; `labels` est le dictionnaire de traduction.
+# `relabeled` (voir relabel()) remplace les agrégats stockés pour les
+# répartitions par sentiment ; la courbe de confiance reste celle du modèle.
+def build_figures(store, labels, start_day=None, end_day=None, relabeled=None):
+    if relabeled is None:
+        summary = store.summary(start_day, end_day)
+        word_counts = store.word_count_histogram(start_day, end_day)
+        hourly_counts = store.hourly_counts(start_day, end_day)
+    else:
+        summary = relabeled_summary(relabeled)
+        word_counts = relabeled_word_counts(relabeled)
+        hourly_counts = relabeled_hourly_counts(relabeled)
+    
+    # Distribution des sentiments
+    label_counts = pd.DataFrame({
+        'label': ['POSITIVE', 'NEUTRAL', 'NEGATIVE'],
+        'count': [summary['positive'], summary.get('neutral', 0), summary['negative']]
+    })
+    fig_pie = style_figure(px.pie(
+        label_counts, 
+        names='label', 
+        values='count',
+        title=labels['sentiment_distribution'],
+        color='label',
+        color_discrete_map=SENTIMENT_COLORS
+    ))
+    
+    # Distribution du nombre de mots (classes pré-calculées)
+    fig_hist = style_figure(px.bar(
+        pd.DataFrame(word_counts), 
+        x='word_count', 
+        y='count',
+        title=labels['word_count_distribution'],
+        color='label',
+        color_discrete_map=SENTIMENT_COLORS
+    ))
+    
+    # Évolution de la confiance
+    series = store.score_series(
+        f"{start_day} 00:00:00" if start_day else None,
+        f"{end_day} 23:59:59" if end_day else None,
+        points=CHART_POINTS
+    )
+    fig_line = build_confidence_figure(series, labels['confidence_evolution'], labels['confidence'])
+    
+    # Sentiments par heure
+    hourly_data = pd.DataFrame(hourly_counts)
+    fig_bar = None
+    if hourly_data['hour'].nunique() > 1:
+        fig_bar = style_figure(
+            px.bar(
+                hourly_data, 
+                x='hour', 
+                y='count',
+                color='label',
+                title=labels['sentiment_by_time'],
+                color_discrete_map=SENTIMENT_COLORS,
+                barmode='group'
+            ),
+            xaxis_title="Heure",
+            yaxis_title="Nombre"
+        )
+    
+    return {'pie': fig_pie, 'word_count': fig_hist, 'confidence': fig_line, 'hourly': fig_bar}
@@ -0,0 +1,224 @@
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+import backends
+import model
+import policy
+import uploads
+from cache import TokenCache
+from scoring import read_batches
+
+# Distillation hors ligne (commande `python cli.py distill`) : le modèle servi
+# (professeur) étiquette un corpus local avec ses probabilités des 5 étoiles,
+# puis un élève plus petit — quelques couches du professeur, mêmes embeddings
+# et même tokenizer — est entraîné sur ces cibles souples. L'élève est
+# enregistré là où le backend `distilled` le charge (voir backends.py).
+
+# Couches du professeur gardées par l'élève (12 pour BERT-base)
+DISTILL_LAYERS = int(os.environ.get("DISTILL_LAYERS", "3"))
+# Les textes servis sont surtout courts : l'entraînement tronque plus tôt
+DISTILL_MAX_LENGTH = int(os.environ.get("DISTILL_MAX_LENGTH", "128"))
+PROB_COLUMNS = [f"prob_{star}_star" for star in range(1, 6)]
+REPORT_FILE = "distill_report.json"
+
+
+# ---------- Corpus étiqueté par le professeur ----------
+
+# Textes et probabilités du professeur ; un fichier déjà passé par
+# `cli.py score` (colonnes prob_*_star) est repris sans relancer le modèle
+def label_corpus(path, column="text", batch_size=64, limit=None, log=None):
+    texts, probs = [], []
+    for chunk in read_batches(path, batch_size):
+        batch = uploads.chunk_texts(chunk, column)
+        if all(name in chunk.columns for name in PROB_COLUMNS) and not chunk[PROB_COLUMNS].isna().any().any():
+            batch_probs = chunk[PROB_COLUMNS].to_numpy(dtype=np.float32)
+        else:
+            batch_probs = np.array([p["probs"] for p in model.classify_texts(batch)], dtype=np.float32)
+        keep = [i for i, text in enumerate(batch) if text.strip()]
+        texts.extend(batch[i] for i in keep)
+        probs.append(batch_probs[keep])
+        if log:
+            log(f"[distill] {len(texts)} textes étiquetés")
+        if limit and len(texts) >= limit:
+            break
+    probs = np.concatenate(probs) if probs else np.zeros((0, len(policy.STARS)), dtype=np.float32)
+    if limit:
+        texts, probs = texts[:limit], probs[:limit]
+    # Probabilités arrondies à 4 décimales par l'API : renormalisées
+    return texts, probs / probs.sum(axis=1, keepdims=True).clip(min=1e-6)
+
+def split(texts, probs, eval_fraction=0.1, seed=0):
+    order = list(range(len(texts)))
+    random.Random(seed).shuffle(order)
+    size = max(1, int(len(order) * eval_fraction)) if len(order) > 1 else 0
+    held, train = order[:size], order[size:]
+    return ([texts[i] for i in train], probs[train]), ([texts[i] for i in held], probs[held])
+
+
+# ---------- Élève ----------
+
+# Couches réparties sur toute la profondeur, la dernière toujours gardée
+def layer_indices(total, layers):
+    if not 0 < layers <= total:
+        raise ValueError(f"L'élève doit garder entre 1 et {total} couches ({layers} demandées)")
+    return sorted({round(i * (total - 1) / max(1, layers - 1)) for i in range(layers)} | {total - 1})[-layers:]
+
+# Copie du professeur réduite à `layers` couches de l'encodeur
+def build_student(teacher, layers=DISTILL_LAYERS):
+    import copy
+    import torch
+    encoder = getattr(teacher.base_model, "encoder", None)
+    if encoder is None or not hasattr(encoder, "layer"):
+        raise ValueError(f"Architecture non prise en charge pour la distillation : {type(teacher).__name__}")
+    student = copy.deepcopy(teacher)
+    keep = layer_indices(len(encoder.layer), layers)
+    student.base_model.encoder.layer = torch.nn.ModuleList(student.base_model.encoder.layer[i] for i in keep)
+    student.config.num_hidden_layers = len(keep)
+    return student
+
+# KL entre les distributions du professeur et de l'élève adoucies par la
+# température ; softmax(log p / T) = softmax(logits / T) du professeur
+def distillation_loss(logits, targets, temperature):
+    import torch.nn.functional as F
+    soft_targets = F.softmax(targets.clamp(min=1e-6).log() / temperature, dim=-1)
+    return F.kl_div(F.log_softmax(logits / temperature, dim=-1), soft_targets, reduction="batchmean") * temperature ** 2
+
+def train(student, tokenizer, texts, probs, epochs=3, batch_size=32, learning_rate=5e-5,
+          temperature=2.0, max_length=DISTILL_MAX_LENGTH, seed=0, log=None):
+    import torch
+    torch.manual_seed(seed)
+    rng = random.Random(seed)
+    optimizer = torch.optim.AdamW(student.parameters(), lr=learning_rate)
+    steps = epochs * ((len(texts) + batch_size - 1) // batch_size)
+    scheduler = torch.optim.lr_scheduler.LambdaLR(optimizer, lambda step: max(0.0, 1 - step / max(1, steps)))
+    targets = torch.from_numpy(probs)
+    student.train()
+    for epoch in range(epochs):
+        order = list(range(len(texts)))
+        rng.shuffle(order)
+        total = 0.0
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            inputs = tokenizer(
+                [texts[i] for i in batch], truncation=True, max_length=max_length,
+                padding=True, return_tensors="pt"
+            )
+            loss = distillation_loss(student(**inputs).logits, targets[batch], temperature)
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(student.parameters(), 1.0)
+            optimizer.step()
+            scheduler.step()
+            optimizer.zero_grad()
+            total += loss.item() * len(batch)
+        if log:
+            log(f"[distill] époque {epoch + 1}/{epochs} : perte {total / max(1, len(texts)):.4f}")
+    student.eval()
+    return student
+
+def save_student(student, tokenizer, model_name=None):
+    target = backends.export_dir("distilled", model_name or model.MODEL_NAME)
+    os.makedirs(target, exist_ok=True)
+    student.save_pretrained(target, safe_serialization=True)
+    tokenizer.save_pretrained(target)
+    return target
+
+
+# ---------- Rapport : latence, mémoire, accord ----------
+
+def parameter_bytes(module):
+    return sum(p.numel() * p.element_size() for p in module.parameters())
+
+def directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+# Temps médian d'un appel de `classify` par lot de `batch_size` textes
+def _latency_ms(classify, texts, batch_size, rounds=5):
+    batch = [texts[i % len(texts)] for i in range(batch_size)]
+    classify(batch)
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        classify(batch)
+        timings.append(time.perf_counter() - start)
+    return round(sorted(timings)[len(timings) // 2] * 1000, 3)
+
+# Accord avec le professeur sur les textes mis de côté : étoiles, sentiment
+# selon la politique du serveur, et POSITIVE/NEGATIVE (politique binary)
+def agreement(teacher_probs, student_probs):
+    teacher_stars = teacher_probs.argmax(axis=1)
+    student_stars = student_probs.argmax(axis=1)
+    return {
+        "samples": len(teacher_probs),
+        "star_agreement": round(float((teacher_stars == student_stars).mean()), 4),
+        "label_agreement": round(float(
+            (policy.classify(teacher_probs) == policy.classify(student_probs)).mean()
+        ), 4),
+        "binary_agreement": round(float(
+            (policy.classify(teacher_probs, "binary") == policy.classify(student_probs, "binary")).mean()
+        ), 4),
+        "mean_absolute_star_error": round(float(
+            np.abs(policy.expected_stars(teacher_probs) - policy.expected_stars(student_probs)).mean()
+        ), 4),
+    }
+
+def report(teacher, student, student_dir, eval_texts, eval_probs, batch_sizes=(1, 16)):
+    student_pipe = model.instrument_pipeline(backends.load_classifier("distilled", model.MODEL_NAME))
+    classify_student = lambda texts: model.classify_texts(texts, pipe=student_pipe)
+    student_probs = np.array([p["probs"] for p in classify_student(eval_texts)], dtype=np.float32)
+    latency = {}
+    # Même chemin pour les deux modèles : sans le cache de tokens du modèle servi
+    shared_cache, model.token_cache = model.token_cache, TokenCache(0)
+    try:
+        for batch_size in batch_sizes:
+            teacher_ms = _latency_ms(model.classify_texts, eval_texts, batch_size)
+            student_ms = _latency_ms(classify_student, eval_texts, batch_size)
+            latency[f"bs={batch_size}"] = {
+                "teacher_ms": teacher_ms,
+                "student_ms": student_ms,
+                "speedup": round(teacher_ms / student_ms, 2) if student_ms else None,
+            }
+    finally:
+        model.token_cache = shared_cache
+    return {
+        "teacher": model.MODEL_ID,
+        "student": student_dir,
+        "layers": {"teacher": teacher.config.num_hidden_layers, "student": student.config.num_hidden_layers},
+        "memory_mb": {
+            "teacher_parameters": round(parameter_bytes(teacher) / 2 ** 20, 1),
+            "student_parameters": round(parameter_bytes(student) / 2 ** 20, 1),
+            "student_on_disk": round(directory_bytes(student_dir) / 2 ** 20, 1),
+        },
+        "latency": latency,
+        "agreement": agreement(eval_probs, student_probs),
+    }
+
+
+def distill(corpus, column="text", layers=None, epochs=3, batch_size=32, learning_rate=5e-5,
+            temperature=2.0, eval_fraction=0.1, limit=None, seed=0, log=None):
+    log = log or (lambda message: print(message, file=sys.stderr))
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+    model.load_model()
+    texts, probs = label_corpus(corpus, column, limit=limit, log=log)
+    if len(texts) < 2:
+        raise ValueError(f"Corpus trop petit pour distiller : {len(texts)} texte(s)")
+    (train_texts, train_probs), (eval_texts, eval_probs) = split(texts, probs, eval_fraction, seed)
+
+    # L'élève part toujours des poids fp32 du professeur, quel que soit le backend servi
+    teacher = AutoModelForSequenceClassification.from_pretrained(backends.source(model.MODEL_NAME))
+    tokenizer = AutoTokenizer.from_pretrained(backends.source(model.MODEL_NAME))
+    student = build_student(teacher, layers or DISTILL_LAYERS)
+    log(f"[distill] élève : {student.config.num_hidden_layers} couches sur {teacher.config.num_hidden_layers}, "
+        f"{len(train_texts)} textes d'entraînement, {len(eval_texts)} d'évaluation")
+    train(student, tokenizer, train_texts, train_probs, epochs, batch_size, learning_rate, temperature, seed=seed, log=log)
+    target = save_student(student, tokenizer)
+
+    result = report(teacher, student, target, eval_texts, eval_probs)
+    result.update(corpus=corpus, train_samples=len(train_texts), epochs=epochs, temperature=temperature)
+    with open(os.path.join(target, REPORT_FILE), "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    return result
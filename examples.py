@@ -0,0 +1,39 @@
+# Dataset d'exemples (interface Streamlit et vérifications hors ligne)
+example_datasets = {
+    'fr': [
+        "J'adore cette application, elle est incroyable et très intuitive !",
+        "Le service client est excellent, j'ai reçu une aide rapide et efficace.",
+        "Quelle déception ! Le produit ne correspond pas du tout à la description.",
+        "Je suis très satisfait de mon achat, la qualité est au rendez-vous.",
+        "C'est horrible, je ne recommande absolument pas cette expérience.",
+        "Une expérience formidable ! Je reviendrai certainement.",
+    ],
+    'en': [
+        "I love this application, it's amazing and very intuitive!",
+        "The customer service is excellent, I received quick and efficient help.",
+        "What a disappointment! The product doesn't match the description at all.",
+        "I'm very satisfied with my purchase, the quality is there.",
+        "It's horrible, I absolutely don't recommend this experience.",
+        "A wonderful experience! I will definitely come back.",
+    ],
+    'es': [
+        "¡Me encanta esta aplicación, es increíble y muy intuitiva!",
+        "El servicio al cliente es excelente, recibí ayuda rápida y eficiente.",
+        "¡Qué decepción! El producto no coincide en absoluto con la descripción.",
+        "Estoy muy satisfecho con mi compra, la calidad está presente.",
+        "Es horrible, no recomiendo absolutamente esta experiencia.",
+        "¡Una experiencia maravillosa! Definitivamente volveré.",
+    ],
+    'ar': [
+        "أحب هذا التطبيق، إنه مذهل وسهل الاستخدام للغاية!",
+        "خدمة العملاء ممتازة، تلقيت مساعدة سريعة وفعالة.",
+        "يا للخيبة! المنتج لا يتطابق مع الوصف على الإطلاق.",
+        "أنا راضٍ جدًا عن عملية الشراء، الجودة موجودة.",
+        "إنه فظيع، لا أوصي بهذه التجربة على الإطلاق.",
+        "تجربة رائعة! سأعود بالتأكيد.",
+    ]
+}
+
+# Toutes les phrases, toutes langues confondues
+def sample_texts():
+    return [text for texts in example_datasets.values() for text in texts]
@@ -0,0 +1,39 @@
+import torch
+
+import bucketing
+import metrics
+from chunking import encode_windows
+from model import grad_context
+
+# Voie rapide : le tokenizer rapide (Rust) encode tous les textes du lot en un
+# appel, les textes déjà vus sortent du cache de tokens, puis chaque groupe de
+# longueurs voisines passe directement dans le modèle (logits -> softmax sur
+# les 5 étoiles), sans le pré/post-traitement générique du pipeline.
+# Renvoie les probabilités des étoiles (tableau textes x 5).
+
+
+def encode(tokenizer, texts, token_cache):
+    encoded = token_cache.get_many(texts)
+    missing = [i for i, ids in enumerate(encoded) if ids is None]
+    if missing:
+        computed = tokenizer([texts[i] for i in missing], truncation=True)["input_ids"]
+        for i, ids in zip(missing, computed):
+            encoded[i] = ids
+        token_cache.put_many([texts[i] for i in missing], computed)
+    return encoded
+
+def classify_fast(pipe, texts, token_cache):
+    tokenizer, model = pipe.tokenizer, pipe.model
+    with metrics.STAGE_LATENCY.time(stage="tokenize"):
+        encoded = encode(tokenizer, texts, token_cache)
+    lengths = [len(ids) for ids in encoded]
+    probs = torch.empty(len(texts), model.config.num_labels)
+    with grad_context():
+        for bucket in bucketing.bucket_by_length(lengths, len(texts)):
+            with metrics.STAGE_LATENCY.time(stage="tokenize"):
+                batch = encode_windows(tokenizer, [list(encoded[i]) for i in bucket])
+            with metrics.STAGE_LATENCY.time(stage="forward"):
+                logits = model(**batch).logits
+            probs[bucket] = torch.softmax(logits.float(), dim=-1)
+            bucketing.padding_stats.record([lengths[i] for i in bucket])
+    return probs.numpy()
@@ -0,0 +1,317 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+# Historique des analyses partagé par toutes les sessions Streamlit et
+# conservé entre les redémarrages (SQLite en mode WAL)
+HISTORY_PATH = os.environ.get("HISTORY_PATH", "history.db")
+# Écritures regroupées : on vide le tampon à N lignes ou toutes les X secondes
+HISTORY_FLUSH_SIZE = int(os.environ.get("HISTORY_FLUSH_SIZE", "64"))
+HISTORY_FLUSH_INTERVAL = float(os.environ.get("HISTORY_FLUSH_INTERVAL", "1.0"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    text TEXT NOT NULL,
+    label TEXT NOT NULL,
+    score REAL NOT NULL,
+    stars INTEGER,
+    word_count INTEGER NOT NULL,
+    probs BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_timestamp ON analyses (timestamp);
+CREATE INDEX IF NOT EXISTS idx_analyses_label_timestamp ON analyses (label, timestamp);
+CREATE TABLE IF NOT EXISTS hourly_stats (
+    day TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    score_sum REAL NOT NULL,
+    PRIMARY KEY (day, hour, label)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('data_version', 0);
+CREATE TABLE IF NOT EXISTS word_count_stats (
+    day TEXT NOT NULL,
+    label TEXT NOT NULL,
+    bin INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, label, bin)
+);
+"""
+
+COLUMNS = ("timestamp", "text", "label", "score", "stars", "word_count", "probs")
+# Largeur (en mots) des classes de l'histogramme du nombre de mots
+WORD_COUNT_BIN = 10
+
+
+# Les horodatages sont des chaînes "YYYY-MM-DD HH:MM:SS" : l'ordre
+# alphabétique est l'ordre chronologique, l'index sur timestamp suffit
+def _time_range(start=None, end=None, column="timestamp"):
+    clauses, params = [], []
+    if start is not None:
+        clauses.append(f"{column} >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append(f"{column} <= ?")
+        params.append(end)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return where, params
+
+# Probabilités des 5 étoiles stockées en float16 : 10 octets par analyse
+def _encode_probs(probs):
+    if probs is None:
+        return None
+    return np.asarray(probs, dtype=np.float16).tobytes()
+
+def _decode_probs(blob):
+    if blob is None:
+        return None
+    return np.frombuffer(blob, dtype=np.float16).astype(float).tolist()
+
+def _row(item):
+    return tuple(_encode_probs(item.get(column)) if column == "probs" else item.get(column) for column in COLUMNS)
+
+# Agrégats d'un lot de lignes : (jour, heure, sentiment) et (jour, sentiment, classe de mots)
+def _aggregate_rows(rows):
+    hourly, words = {}, {}
+    for timestamp, _, label, score, _, word_count, *_ in rows:
+        day, hour = timestamp[:10], int(timestamp[11:13])
+        count, score_sum = hourly.get((day, hour, label), (0, 0.0))
+        hourly[(day, hour, label)] = (count + 1, score_sum + score)
+        key = (day, label, word_count // WORD_COUNT_BIN)
+        words[key] = words.get(key, 0) + 1
+    return hourly, words
+
+
+class HistoryStore:
+    def __init__(self, path=HISTORY_PATH, flush_size=HISTORY_FLUSH_SIZE, flush_interval=HISTORY_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_size = flush_size
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._rebuild_aggregates_if_missing()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_periodically, args=(flush_interval,), daemon=True, name="history-flush"
+        )
+        self._flusher.start()
+
+    # ---------- Écriture ----------
+
+    def append(self, item):
+        self.append_many([item])
+
+    def append_many(self, items):
+        with self._lock:
+            self._pending.extend(_row(item) for item in items)
+            if len(self._pending) >= self.flush_size:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    # Lignes et agrégats écrits dans la même transaction
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        with self._db:
+            self._db.executemany(
+                f"INSERT INTO analyses ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                self._pending
+            )
+            self._update_aggregates(self._pending)
+            self._bump_version()
+        self._pending = []
+
+    # Change à chaque écriture : sert de clé aux figures mises en cache
+    def _bump_version(self):
+        self._db.execute("UPDATE meta SET value = value + 1 WHERE key = 'data_version'")
+
+    def _update_aggregates(self, rows):
+        hourly, words = _aggregate_rows(rows)
+        self._db.executemany(
+            "INSERT INTO hourly_stats (day, hour, label, count, score_sum) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (day, hour, label) DO UPDATE SET "
+            "count = count + excluded.count, score_sum = score_sum + excluded.score_sum",
+            [(day, hour, label, count, score_sum) for (day, hour, label), (count, score_sum) in hourly.items()]
+        )
+        self._db.executemany(
+            "INSERT INTO word_count_stats (day, label, bin, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (day, label, bin) DO UPDATE SET count = count + excluded.count",
+            [(day, label, bin, count) for (day, label, bin), count in words.items()]
+        )
+
+    # Base créée avant l'ajout des probabilités : colonne ajoutée, vide pour
+    # les anciennes analyses
+    def _migrate(self):
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(analyses)")]
+        if columns and "probs" not in columns:
+            self._db.execute("ALTER TABLE analyses ADD COLUMN probs BLOB")
+
+    # Base créée avant l'ajout des agrégats : on les calcule une fois
+    def _rebuild_aggregates_if_missing(self):
+        if self._db.execute("SELECT 1 FROM hourly_stats LIMIT 1").fetchone():
+            return
+        cursor = self._db.execute(f"SELECT {', '.join(COLUMNS)} FROM analyses")
+        with self._db:
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                self._update_aggregates(rows)
+
+    def _flush_periodically(self, interval):
+        while not self._closed.wait(interval):
+            self.flush()
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            self._flush_locked()
+            self._db.close()
+
+    def clear(self):
+        with self._lock:
+            self._pending = []
+            with self._db:
+                self._db.execute("DELETE FROM analyses")
+                self._db.execute("DELETE FROM hourly_stats")
+                self._db.execute("DELETE FROM word_count_stats")
+                self._bump_version()
+
+    # ---------- Lecture (le tampon est vidé avant chaque requête) ----------
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            self._flush_locked()
+            return self._db.execute(sql, params).fetchall()
+
+    def data_version(self):
+        return self._query("SELECT value FROM meta WHERE key = 'data_version'")[0][0]
+
+    def time_bounds(self):
+        return self._query("SELECT MIN(timestamp), MAX(timestamp) FROM analyses")[0]
+
+    # ---------- Agrégats incrémentaux ----------
+    # Bornes en jours ("YYYY-MM-DD") : le coût dépend du nombre de jours
+    # couverts, pas du nombre d'analyses
+
+    def total(self):
+        return self._query("SELECT COALESCE(SUM(count), 0) FROM hourly_stats")[0][0]
+
+    def summary(self, start_day=None, end_day=None):
+        where, params = _time_range(start_day, end_day, column="day")
+        rows = self._query(
+            f"SELECT label, SUM(count), SUM(score_sum) FROM hourly_stats{where} GROUP BY label", params
+        )
+        counts = {label: count for label, count, _ in rows}
+        total = sum(counts.values())
+        return {
+            "total": total,
+            "positive": counts.get("POSITIVE", 0),
+            "negative": counts.get("NEGATIVE", 0),
+            "neutral": counts.get("NEUTRAL", 0),
+            "avg_score": sum(score_sum for _, _, score_sum in rows) / total if total else 0.0,
+        }
+
+    def hourly_counts(self, start_day=None, end_day=None):
+        where, params = _time_range(start_day, end_day, column="day")
+        rows = self._query(
+            f"SELECT hour, label, SUM(count) FROM hourly_stats{where} GROUP BY hour, label ORDER BY hour",
+            params
+        )
+        return [{"hour": hour, "label": label, "count": count} for hour, label, count in rows]
+
+    def word_count_histogram(self, start_day=None, end_day=None):
+        where, params = _time_range(start_day, end_day, column="day")
+        rows = self._query(
+            f"SELECT bin, label, SUM(count) FROM word_count_stats{where} GROUP BY bin, label ORDER BY bin",
+            params
+        )
+        return [
+            {"word_count": bin * WORD_COUNT_BIN, "label": label, "count": count}
+            for bin, label, count in rows
+        ]
+
+    # Série des scores réduite à `points` classes consécutives par sentiment
+    # (min, max, moyenne), calculée par SQLite : la taille du résultat ne
+    # dépend pas du nombre d'analyses. Les classes sont découpées sur le rang
+    # (ROW_NUMBER) des analyses de la période, pas sur leur id : des ids
+    # manquants ne les déséquilibrent pas. `index` est le rang (à partir de 1)
+    # de la première analyse de la classe dans la période.
+    def score_series(self, start=None, end=None, points=300):
+        where, params = _time_range(start, end)
+        total = self._query(f"SELECT COUNT(*) FROM analyses{where}", params)[0][0]
+        if not total:
+            return []
+        rows = self._query(
+            f"SELECT (rank - 1) * ? / ? AS bucket, label, MIN(rank), MIN(score), MAX(score), AVG(score), COUNT(*) "
+            f"FROM (SELECT ROW_NUMBER() OVER (ORDER BY id) AS rank, label, score FROM analyses{where}) "
+            f"GROUP BY bucket, label ORDER BY bucket",
+            [min(points, total), total] + params
+        )
+        return [
+            {"index": rank, "label": label, "min": low, "max": high, "mean": mean, "count": count}
+            for _, label, rank, low, high, mean, count in rows
+        ]
+
+    # Lignes de la période, les plus récentes d'abord
+    def query(self, start=None, end=None, limit=None):
+        where, params = _time_range(start, end)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM analyses{where} ORDER BY timestamp DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        rows = [dict(zip(COLUMNS, row)) for row in self._query(sql, params)]
+        for row in rows:
+            row["probs"] = _decode_probs(row["probs"])
+        return rows
+
+    def recent(self, limit=10):
+        return self.query(limit=limit)
+
+    # ---------- Relecture complète pour une autre politique de décision ----------
+
+    # Colonnes de la période sous forme de tableaux NumPy (probabilités n x 5
+    # en float32) : policy.classify() réétiquette tout l'historique sans modèle
+    def policy_arrays(self, start_day=None, end_day=None):
+        import policy
+        where, params = _time_range(
+            f"{start_day} 00:00:00" if start_day else None,
+            f"{end_day} 23:59:59" if end_day else None
+        )
+        rows = self._query(
+            f"SELECT CAST(substr(timestamp, 12, 2) AS INTEGER), word_count, label, stars, probs FROM analyses{where}",
+            params
+        )
+        hours, word_counts, labels, stars, blobs = (list(column) for column in zip(*rows)) if rows else ([],) * 5
+        probs = np.zeros((len(rows), len(policy.STARS)), dtype=np.float32)
+        stored = np.array([blob is not None for blob in blobs], dtype=bool)
+        if stored.any():
+            probs[stored] = np.frombuffer(
+                b"".join(blob for blob in blobs if blob is not None), dtype=np.float16
+            ).reshape(-1, len(policy.STARS))
+        if not stored.all():
+            missing = ~stored
+            probs[missing] = policy.one_hot(
+                [stars[i] if stars[i] is not None else np.nan for i in np.flatnonzero(missing)],
+                [labels[i] for i in np.flatnonzero(missing)]
+            )
+        return {
+            "hour": np.array(hours, dtype=np.int64),
+            "word_count": np.array(word_counts, dtype=np.int64),
+            "probs": probs,
+        }
@@ -0,0 +1,135 @@
+import asyncio
+import contextlib
+import json
+import os
+import time
+
+from fastapi import WebSocketDisconnect
+
+import metrics
+import model
+from batching import QueueFullError
+
+# Analyse en direct sur WebSocket (/ws/predict) : le client envoie le texte
+# complet à chaque frappe, le serveur attend une pause (debounce), annule
+# l'inférence devenue obsolète et ne renvoie que le résultat du dernier texte.
+# Une connexion lance au plus une inférence toutes les LIVE_MIN_INTERVAL_MS.
+LIVE_DEBOUNCE_MS = float(os.environ.get("LIVE_DEBOUNCE_MS", "150"))
+# Frappe continue : une analyse part quand même au bout de ce délai
+LIVE_MAX_WAIT_MS = float(os.environ.get("LIVE_MAX_WAIT_MS", "1000"))
+LIVE_MIN_INTERVAL_MS = float(os.environ.get("LIVE_MIN_INTERVAL_MS", "300"))
+
+LIVE_EVENTS = metrics.registry.register(metrics.Counter(
+    "sentiment_live_events_total", "Événements des connexions /ws/predict", labels=("event",)
+))
+
+
+class LiveSession:
+    def __init__(self, websocket, submit_text,
+                 debounce_ms=LIVE_DEBOUNCE_MS, max_wait_ms=LIVE_MAX_WAIT_MS, min_interval_ms=LIVE_MIN_INTERVAL_MS):
+        self.websocket = websocket
+        # await submit_text(text) -> (prédiction en cache, None) ou (None, future) ; voir api.py
+        self.submit_text = submit_text
+        self.debounce = debounce_ms / 1000.0
+        self.max_wait = max(max_wait_ms, debounce_ms) / 1000.0
+        self.min_interval = min_interval_ms / 1000.0
+        self.latest = None
+        self.changed = asyncio.Event()
+        self.sequence = 0
+
+    async def run(self):
+        scorer = asyncio.create_task(self._score_loop())
+        try:
+            await self._receive_loop()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            scorer.cancel()
+            with contextlib.suppress(asyncio.CancelledError, WebSocketDisconnect, RuntimeError):
+                await scorer
+
+    # Messages : le texte brut, ou {"text": "...", "seq": ...} ; seq est
+    # renvoyé avec le résultat (numéro de message sinon)
+    def _parse(self, message):
+        self.sequence += 1
+        try:
+            data = json.loads(message)
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and isinstance(data.get("text"), str):
+            return data.get("seq", self.sequence), data["text"]
+        return self.sequence, message
+
+    async def _receive_loop(self):
+        while True:
+            message = await self.websocket.receive_text()
+            self.latest = self._parse(message)
+            self.changed.set()
+            LIVE_EVENTS.inc(event="message")
+
+    async def _score_loop(self):
+        last_run = -self.min_interval
+        while True:
+            await self.changed.wait()
+            await self._settle()
+            delay = last_run + self.min_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.changed.clear()
+            seq, text = self.latest
+            last_run = time.monotonic()
+            await self._score(seq, text)
+
+    # Attend `debounce` secondes sans nouveau message, au plus `max_wait`
+    async def _settle(self):
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            self.changed.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(self.changed.wait(), min(self.debounce, remaining))
+            except asyncio.TimeoutError:
+                return
+
+    async def _score(self, seq, text):
+        if not text.strip():
+            return
+        try:
+            prediction, future = await self.submit_text(text)
+        except (model.ModelNotReadyError, QueueFullError) as e:
+            await self._send({"seq": seq, "error": str(e)})
+            return
+        if future is None:
+            LIVE_EVENTS.inc(event="cached")
+            await self._send({"seq": seq, **prediction})
+            return
+
+        LIVE_EVENTS.inc(event="inference")
+        result = asyncio.wrap_future(future)
+        newer = asyncio.create_task(self.changed.wait())
+        try:
+            done, _ = await asyncio.wait({result, newer}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        finally:
+            newer.cancel()
+        if result not in done:
+            # Texte plus récent : retiré de la file s'il n'est pas encore parti,
+            # sinon son résultat est simplement ignoré
+            future.cancel()
+            result.add_done_callback(lambda f: f.cancelled() or f.exception())
+            LIVE_EVENTS.inc(event="cancelled")
+            return
+        try:
+            prediction = result.result()
+        except Exception as e:
+            await self._send({"seq": seq, "error": repr(e)})
+            return
+        await self._send({"seq": seq, **prediction})
+
+    async def _send(self, payload):
+        await self.websocket.send_text(json.dumps(payload, ensure_ascii=False))
+        LIVE_EVENTS.inc(event="sent")
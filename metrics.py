@@ -0,0 +1,196 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Métriques au format texte Prometheus, sans dépendance : quelques compteurs
+# protégés par un verrou, assez légers pour rester actifs en production.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name + _format_labels(self.labels, key), value) for key, value in items]
+
+
+# Valeur lue au moment de l'export (profondeur de file, temps de chargement...).
+# kind="counter" pour un total tenu ailleurs (compteurs du cache par exemple).
+class Gauge:
+    def __init__(self, name, help, read, kind="gauge"):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.kind = kind
+
+    def samples(self):
+        value = self.read()
+        if value is None:
+            return []
+        return [(self.name, value)]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    # drain()/merge() remontent les observations des processus d'inférence
+    def drain(self):
+        with self._lock:
+            series, self._series = self._series, {}
+        return series
+
+    # Dans un processus créé par fork : verrou neuf, observations héritées oubliées
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def merge(self, series):
+        with self._lock:
+            for key, (counts, total, count) in series.items():
+                current = self._series.get(key)
+                if current is None:
+                    current = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+                current[0] = [a + b for a, b in zip(current[0], counts)]
+                current[1] += total
+                current[2] += count
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        samples = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, key, ("le", _format_value(float(bound))))
+                samples.append((f"{self.name}_bucket{labels}", cumulative))
+            samples.append((f"{self.name}_bucket{_format_labels(self.labels, key, ('le', '+Inf'))}", count))
+            samples.append((f"{self.name}_sum{_format_labels(self.labels, key)}", total))
+            samples.append((f"{self.name}_count{_format_labels(self.labels, key)}", count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, value in metric.samples():
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Étapes : parse (routage + validation), tokenize, forward, postprocess
+# (softmax + conversion étoiles -> POSITIVE/NEGATIVE), serialize
+STAGE_LATENCY = registry.register(Histogram(
+    "sentiment_stage_latency_seconds", "Durée de chaque étape du traitement", labels=("stage",)
+))
+REQUESTS = registry.register(Counter(
+    "sentiment_http_requests_total", "Requêtes HTTP reçues", labels=("method", "path", "status")
+))
+REQUEST_LATENCY = registry.register(Histogram(
+    "sentiment_http_request_latency_seconds", "Durée totale des requêtes HTTP", labels=("method", "path")
+))
+BATCH_SIZE = registry.register(Histogram(
+    "sentiment_batch_size", "Textes par passage de l'exécuteur d'inférence", buckets=SIZE_BUCKETS
+))
+
+
+# Middleware ASGI (plus léger que BaseHTTPMiddleware, compatible streaming).
+# L'instant d'arrivée est placé dans request.state pour mesurer l'étape parse.
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        scope.setdefault("state", {})["request_start"] = start
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Chemins inconnus regroupés pour borner la cardinalité
+            path = scope["path"] if status[0] != 404 else "other"
+            REQUESTS.inc(method=scope["method"], path=path, status=status[0])
+            REQUEST_LATENCY.observe(time.perf_counter() - start, method=scope["method"], path=path)
+
+def observe_parse(request):
+    start = getattr(request.state, "request_start", None)
+    if start is not None:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage="parse")
@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+import bucketing
+import metrics
+import policy
+import tuning
+from cache import TokenCache
+from examples import sample_texts
+
+# Profil écrit par `cli.py autotune`, appliqué avant la lecture des réglages
+tuning.load_profile()
+
+# torch, transformers (via backends.py) et chunking.py ne sont importés qu'au
+# chargement du modèle : le serveur ouvre son port et l'interface s'affiche
+# sans attendre ces imports
+
+MODEL_NAME = "nlptown/bert-base-multilingual-uncased-sentiment"
+# torch-fp32, torch-int8-dynamic ou onnx (voir backends.py)
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "torch-fp32")
+# Identifiant du modèle servi, utilisé entre autres comme clé du cache
+MODEL_ID = f"{MODEL_NAME}@{MODEL_BACKEND}"
+# Textes longs : vide = troncature à 512 tokens (comportement d'origine),
+# sinon fenêtres glissantes agrégées par mean, weighted ou max (voir chunking.py)
+LONG_TEXT_AGGREGATION = os.environ.get("LONG_TEXT_AGGREGATION", "")
+LONG_TEXT_STRIDE = int(os.environ.get("LONG_TEXT_STRIDE", "384"))
+LONG_TEXT_MAX_WINDOWS = int(os.environ.get("LONG_TEXT_MAX_WINDOWS", "32"))
+LONG_TEXT_BATCH_SIZE = int(os.environ.get("LONG_TEXT_BATCH_SIZE", "32"))
+# Voie rapide (fastpath.py) : tokenizer en lot + forward direct ; 0 = pipeline
+INFERENCE_FAST_PATH = os.environ.get("INFERENCE_FAST_PATH", "1") == "1"
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "4096"))
+# Forward sans suivi des gradients : torch.inference_mode (le plus léger)
+# ou torch.no_grad (repli si un backend ne supporte pas le premier)
+GRAD_MODES = ("inference", "no_grad")
+INFERENCE_GRAD_MODE = os.environ.get("INFERENCE_GRAD_MODE", "inference")
+
+# Réglages autres que le modèle qui changent les prédictions : font partie
+# de la clé du cache (un cache persistant ne ressert pas des résultats
+# calculés avec une autre agrégation des textes longs)
+def inference_config_id():
+    if not LONG_TEXT_AGGREGATION:
+        return "truncate"
+    return f"{LONG_TEXT_AGGREGATION}:{LONG_TEXT_STRIDE}:{LONG_TEXT_MAX_WINDOWS}"
+
+class ModelNotReadyError(Exception):
+    pass
+
+# Le modèle n'est plus chargé à l'import : load_model() est appelé en
+# arrière-plan au démarrage du serveur, ou directement par la CLI.
+# Phases : idle -> loading -> warming -> ready (ou failed)
+classifier = None
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+status = {
+    "phase": "idle",
+    "error": None,
+    "load_seconds": None,
+    "warmup_seconds": None,
+    # Durée de chaque phase du démarrage (import, load, workers, warmup)
+    "phases": {},
+    "ready_after_seconds": None,
+}
+_load_lock = threading.Lock()
+_started_at = time.time()
+
+def is_ready():
+    return status["phase"] == "ready"
+
+def status_report():
+    return dict(status, model=MODEL_ID, uptime_seconds=round(time.time() - _started_at, 3))
+
+def mark_ready():
+    status["phase"] = "ready"
+    status["ready_after_seconds"] = round(time.time() - _started_at, 3)
+    phases = ", ".join(f"{name} {seconds} s" for name, seconds in status["phases"].items())
+    print(f"Modèle prêt en {status['ready_after_seconds']} s ({phases})")
+
+def mark_failed(error):
+    status["phase"] = "failed"
+    status["error"] = repr(error)
+    print(f"Erreur modèle : {error}")
+
+@contextmanager
+def startup_phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        status["phases"][name] = round(time.perf_counter() - start, 3)
+
+# Charger le modèle (une seule fois, même en cas d'appels concurrents)
+def load_model():
+    global classifier
+    with _load_lock:
+        if classifier is None:
+            status["phase"] = "loading"
+            with startup_phase("import"):
+                import torch  # noqa: F401
+                import transformers  # noqa: F401
+                import backends
+            start = time.perf_counter()
+            with startup_phase("load"):
+                classifier = instrument_pipeline(backends.load_classifier(MODEL_BACKEND, MODEL_NAME))
+            status["load_seconds"] = round(time.perf_counter() - start, 3)
+    return classifier
+
+# Remplace le modèle servi (voir registry.py) : chaque appel à classify_texts
+# lit `classifier` une seule fois, les lots en cours finissent sur l'ancien
+def activate(pipe, name, backend):
+    global classifier, MODEL_NAME, MODEL_BACKEND, MODEL_ID
+    with _load_lock:
+        MODEL_NAME, MODEL_BACKEND = name, backend
+        MODEL_ID = f"{name}@{backend}"
+        classifier = pipe
+        token_cache.clear()
+
+def _timed(fn, stage):
+    def wrapper(*args, **kwargs):
+        with metrics.STAGE_LATENCY.time(stage=stage):
+            return fn(*args, **kwargs)
+    return wrapper
+
+# Chronométrage des étapes internes du pipeline (tokenisation, forward, post-traitement)
+def instrument_pipeline(pipe):
+    for method, stage in (("preprocess", "tokenize"), ("forward", "forward"), ("postprocess", "postprocess")):
+        setattr(pipe, method, _timed(getattr(pipe, method), stage))
+    return pipe
+
+# Pipeline partageant les poids de `pipe` (par défaut le modèle servi) avec son
+# propre tokenizer : le tokenizer rapide refuse les appels concurrents depuis
+# plusieurs threads ("Already borrowed")
+def pipeline_copy(pipe=None):
+    import copy
+    import backends
+    pipe = pipe or classifier
+    return instrument_pipeline(backends.build_pipeline(pipe.model, copy.deepcopy(pipe.tokenizer)))
+
+# Quelques lots factices aux tailles configurées : le premier vrai appel
+# ne paie ni l'initialisation paresseuse de torch ni les allocations
+def warm_up(classify_fn, batch_sizes, rounds=1):
+    status["phase"] = "warming"
+    start = time.perf_counter()
+    texts = sample_texts()
+    with startup_phase("warmup"):
+        for size in batch_sizes:
+            batch = [texts[i % len(texts)] for i in range(size)]
+            for _ in range(rounds):
+                classify_fn(batch)
+    status["warmup_seconds"] = round(time.perf_counter() - start, 3)
+
+# Répartit les cœurs entre les workers d'inférence pour éviter la sursouscription.
+# Les threads inter-op ne peuvent être fixés qu'avant le premier calcul parallèle
+# du processus : l'appel est ignoré s'il arrive trop tard.
+def set_torch_threads(workers, threads=None, interop_threads=None):
+    import torch
+    if threads is None:
+        threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+    torch.set_num_threads(threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            pass
+    return threads
+
+def grad_context():
+    import torch
+    return torch.no_grad() if INFERENCE_GRAD_MODE == "no_grad" else torch.inference_mode()
+
+# Textes regroupés par longueur en tokens (voir bucketing.py), un passage du
+# modèle par groupe, probabilités des étoiles remises dans l'ordre d'origine
+def classify_bucketed(pipe, texts):
+    with metrics.STAGE_LATENCY.time(stage="tokenize"):
+        lengths = [len(ids) for ids in pipe.tokenizer(texts, truncation=True)["input_ids"]]
+    label2id = pipe.model.config.label2id
+    probs = np.zeros((len(texts), len(label2id)), dtype=np.float32)
+    for bucket in bucketing.bucket_by_length(lengths, len(texts)):
+        bucket_texts = [texts[i] for i in bucket]
+        with grad_context():
+            outputs = pipe(bucket_texts, batch_size=len(bucket_texts), truncation=True, top_k=None)
+        for i, output in zip(bucket, outputs):
+            for result in output:
+                probs[i, label2id[result["label"]]] = result["score"]
+        bucketing.padding_stats.record([lengths[i] for i in bucket])
+    return probs
+
+# Point d'entrée de toute inférence sur une liste de textes
+# (pipe permet de viser un autre backend, par exemple pour la vérification de parité)
+def classify_texts(texts, pipe=None):
+    if pipe is None:
+        pipe = classifier
+    if LONG_TEXT_AGGREGATION:
+        import chunking
+        probs = chunking.classify_long_texts(
+            pipe, texts,
+            aggregation=LONG_TEXT_AGGREGATION,
+            stride=LONG_TEXT_STRIDE,
+            max_windows=LONG_TEXT_MAX_WINDOWS,
+            batch_size=LONG_TEXT_BATCH_SIZE
+        )
+    elif INFERENCE_FAST_PATH:
+        import fastpath
+        # Le cache de tokens ne vaut que pour le tokenizer du modèle servi
+        cache = token_cache if pipe is classifier else TokenCache(0)
+        probs = fastpath.classify_fast(pipe, list(texts), cache)
+    else:
+        probs = classify_bucketed(pipe, list(texts))
+    # Sentiment, étoiles et confiance déduits des probabilités (voir policy.py)
+    with metrics.STAGE_LATENCY.time(stage="postprocess"):
+        return policy.predictions(probs)
@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+
+# Politique de décision : passage des 5 probabilités d'étoiles au sentiment.
+# Le modèle ne calcule que les probabilités ; les étiquettes en sont déduites
+# ici, en NumPy, pour un lot comme pour tout l'historique (tableau de bord).
+#   binary      : étoile la plus probable >= 4 -> POSITIVE, sinon NEGATIVE (d'origine)
+#   three-class : 1-2 étoiles NEGATIVE, 3 NEUTRAL, 4-5 POSITIVE
+#   expected    : espérance du nombre d'étoiles comparée à deux seuils
+POLICIES = ("binary", "three-class", "expected")
+SENTIMENT_POLICY = os.environ.get("SENTIMENT_POLICY", "binary")
+POLICY_NEGATIVE_THRESHOLD = float(os.environ.get("POLICY_NEGATIVE_THRESHOLD", "2.5"))
+POLICY_POSITIVE_THRESHOLD = float(os.environ.get("POLICY_POSITIVE_THRESHOLD", "3.5"))
+# Fait partie de la clé du cache des prédictions : changer de politique ne
+# ressert pas d'étiquettes calculées avec l'ancienne
+POLICY_ID = f"{SENTIMENT_POLICY}:{POLICY_NEGATIVE_THRESHOLD}:{POLICY_POSITIVE_THRESHOLD}"
+
+LABELS = np.array(["NEGATIVE", "NEUTRAL", "POSITIVE"])
+STARS = np.arange(1, 6, dtype=np.float32)
+
+
+def expected_stars(probs):
+    return probs @ STARS
+
+# Sentiment de chaque ligne de probs (tableau n x 5)
+def classify(probs, policy=SENTIMENT_POLICY, negative=POLICY_NEGATIVE_THRESHOLD, positive=POLICY_POSITIVE_THRESHOLD):
+    probs = np.asarray(probs, dtype=np.float32).reshape(-1, len(STARS))
+    stars = probs.argmax(axis=1) + 1
+    if policy == "binary":
+        classes = np.where(stars >= 4, 2, 0)
+    elif policy == "three-class":
+        classes = np.where(stars >= 4, 2, np.where(stars == 3, 1, 0))
+    elif policy == "expected":
+        value = expected_stars(probs)
+        classes = np.where(value >= positive, 2, np.where(value <= negative, 0, 1))
+    else:
+        raise ValueError(f"Politique inconnue : {policy} (choix : {', '.join(POLICIES)})")
+    return LABELS[classes]
+
+# Prédictions au format de l'API : sentiment selon la politique du serveur,
+# confiance = probabilité de l'étoile retenue, probabilités des 5 étoiles.
+# Arrondi en float64 : un float32 arrondi à 4 décimales redevient
+# 0.10000000149011612 une fois converti en float Python.
+def predictions(probs):
+    probs = np.asarray(probs, dtype=np.float32).reshape(-1, len(STARS))
+    labels = classify(probs).tolist()
+    stars = (probs.argmax(axis=1) + 1).tolist()
+    rounded = probs.astype(np.float64).round(4)
+    scores = rounded.max(axis=1).tolist()
+    rounded = rounded.tolist()
+    return [
+        {"label": label, "score": score, "stars": star, "probs": row}
+        for label, score, star, row in zip(labels, scores, stars, rounded)
+    ]
+
+# Historique sans probabilités (analyses antérieures) : tout le poids sur
+# l'étoile enregistrée, ou sur 4 / 2 étoiles d'après l'étiquette
+def one_hot(stars, labels):
+    stars = np.asarray(stars, dtype=np.float64)
+    fallback = np.where(np.asarray(labels) == "POSITIVE", 4, 2)
+    stars = np.where(np.isnan(stars), fallback, stars).astype(int)
+    probs = np.zeros((len(stars), len(STARS)), dtype=np.float32)
+    probs[np.arange(len(stars)), stars - 1] = 1.0
+    return probs
@@ -0,0 +1,251 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import model
+from examples import sample_texts
+
+# Fraction des lots recopiés vers le modèle candidat (shadow) par défaut
+SHADOW_SAMPLE_RATE = float(os.environ.get("SHADOW_SAMPLE_RATE", "0.1"))
+# Lots shadow en attente au-delà desquels les suivants sont ignorés :
+# le candidat ne ralentit jamais le chemin des requêtes
+SHADOW_MAX_PENDING = int(os.environ.get("SHADOW_MAX_PENDING", "4"))
+# Threads torch du worker shadow en mode processus
+SHADOW_THREADS = int(os.environ.get("SHADOW_THREADS", "1"))
+
+SHADOW_LATENCY = metrics.registry.register(metrics.Histogram(
+    "sentiment_shadow_batch_latency_seconds", "Durée d'un lot recopié, par modèle", labels=("role",)
+))
+
+
+# Comparaison du candidat au modèle actif sur le trafic recopié
+class ShadowStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.batches = 0
+            self.texts = 0
+            self.label_agreements = 0
+            self.star_agreements = 0
+            self.primary_seconds = 0.0
+            self.candidate_seconds = 0.0
+            self.dropped = 0
+            self.errors = 0
+            self.last_error = None
+
+    def record(self, primary, candidate, primary_seconds, candidate_seconds):
+        SHADOW_LATENCY.observe(primary_seconds, role="primary")
+        SHADOW_LATENCY.observe(candidate_seconds, role="candidate")
+        with self._lock:
+            self.batches += 1
+            self.texts += len(primary)
+            self.label_agreements += sum(p["label"] == c["label"] for p, c in zip(primary, candidate))
+            self.star_agreements += sum(p["stars"] == c["stars"] for p, c in zip(primary, candidate))
+            self.primary_seconds += primary_seconds
+            self.candidate_seconds += candidate_seconds
+
+    # Lot non recopié : trop de comparaisons en cours, ou pas de quoi évaluer le candidat
+    def drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def error(self, error):
+        with self._lock:
+            self.errors += 1
+            self.last_error = repr(error)
+
+    def report(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "texts": self.texts,
+                "label_agreement": self.label_agreements / self.texts if self.texts else None,
+                "star_agreement": self.star_agreements / self.texts if self.texts else None,
+                "primary_ms_per_batch": round(self.primary_seconds / self.batches * 1000, 3) if self.batches else None,
+                "candidate_ms_per_batch": round(self.candidate_seconds / self.batches * 1000, 3) if self.batches else None,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "last_error": self.last_error,
+            }
+
+
+# Modèles connus du serveur, identifiés par "nom@backend" :
+# - le modèle actif sert les requêtes (model.classifier) ;
+# - un candidat chargé et préchauffé en arrière-plan reçoit une fraction du
+#   trafic en shadow, puis promote() le rend actif sans interruption.
+# `activate(pipe, name, backend)` est fourni par api.py : il remplace le modèle
+# servi (et le pool de processus s'il y en a un).
+# En mode processus, le processus principal ne fait aucune inférence :
+# `shadow_pool(pipe)` crée pour le candidat un pool de workers à part, qui
+# sert à son préchauffage et au trafic recopié.
+class ModelRegistry:
+    def __init__(self, activate, warm_batch_sizes=(1,), shadow_pool=None):
+        self._activate = activate
+        self.warm_batch_sizes = warm_batch_sizes
+        self._shadow_pool = shadow_pool
+        self.entries = {}
+        self.active_id = None
+        self.candidate_id = None
+        self.shadow_rate = 0.0
+        self.shadow = ShadowStats()
+        self._lock = threading.Lock()
+        self._promote_lock = threading.Lock()
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._shadow_pending = 0
+
+    def register_active(self, name, backend, load_seconds=None, warmup_seconds=None):
+        model_id = f"{name}@{backend}"
+        with self._lock:
+            self.entries[model_id] = {
+                "name": name, "backend": backend, "phase": "ready", "error": None,
+                "load_seconds": load_seconds, "warmup_seconds": warmup_seconds, "pipe": model.classifier,
+                "pool": None,
+            }
+            self.active_id = model_id
+
+    # Chargement en arrière-plan ; le modèle devient candidat, ou actif si promote
+    def load(self, name, backend, promote=False, shadow_rate=None):
+        model_id = f"{name}@{backend}"
+        with self._lock:
+            current = self.entries.get(model_id)
+            if model_id == self.active_id:
+                raise ValueError(f"{model_id} est déjà le modèle actif")
+            if current is not None and current["phase"] in ("loading", "warming"):
+                raise ValueError(f"{model_id} est déjà en cours de chargement")
+            if current is not None:
+                self._release(current)
+            entry = self.entries[model_id] = {
+                "name": name, "backend": backend, "phase": "loading", "error": None,
+                "load_seconds": None, "warmup_seconds": None, "pipe": None, "pool": None,
+            }
+        threading.Thread(
+            target=self._prepare, args=(model_id, entry, promote, shadow_rate),
+            daemon=True, name=f"registry-{model_id}"
+        ).start()
+        return model_id
+
+    def _prepare(self, model_id, entry, promote, shadow_rate):
+        import backends
+        try:
+            start = time.perf_counter()
+            pipe = model.instrument_pipeline(backends.load_classifier(entry["backend"], entry["name"]))
+            entry["load_seconds"] = round(time.perf_counter() - start, 3)
+            # Promotion directe en mode processus : le nouveau pool est préchauffé par api.py
+            if self._shadow_pool is None or not promote:
+                entry["phase"] = "warming"
+                start = time.perf_counter()
+                if self._shadow_pool is not None:
+                    entry["pool"] = self._shadow_pool(pipe)
+                texts = sample_texts()
+                for size in self.warm_batch_sizes:
+                    batch = [texts[i % len(texts)] for i in range(size)]
+                    if entry["pool"] is not None:
+                        entry["pool"].classify_texts(batch)
+                    else:
+                        model.classify_texts(batch, pipe=pipe)
+                entry["warmup_seconds"] = round(time.perf_counter() - start, 3)
+            entry["pipe"] = pipe
+            entry["phase"] = "ready"
+        except Exception as e:
+            entry["phase"] = "failed"
+            entry["error"] = repr(e)
+            self._release(entry)
+            return
+        if promote:
+            self.promote(model_id)
+            return
+        with self._lock:
+            previous = self.entries.get(self.candidate_id)
+            self.candidate_id = model_id
+            self.shadow_rate = SHADOW_SAMPLE_RATE if shadow_rate is None else shadow_rate
+        if previous is not None and previous is not entry:
+            self._release(previous)
+        self.shadow.reset()
+
+    # Arrête le pool shadow d'un modèle qui n'est plus candidat
+    def _release(self, entry):
+        pool, entry["pool"] = entry.get("pool"), None
+        if pool is not None:
+            threading.Thread(target=pool.retire, daemon=True, name="shadow-pool-retire").start()
+
+    # Bascule atomique : les lots déjà partis finissent sur l'ancien modèle,
+    # les suivants partent sur le nouveau
+    def promote(self, model_id=None):
+        with self._promote_lock:
+            model_id = model_id or self.candidate_id
+            entry = self.entries.get(model_id)
+            if entry is None or entry["phase"] != "ready":
+                raise ValueError(f"Aucun modèle prêt à promouvoir ({model_id})")
+            if model_id == self.active_id:
+                return model_id
+            self._activate(entry["pipe"], entry["name"], entry["backend"])
+            self._release(entry)
+            with self._lock:
+                previous = self.entries.get(self.active_id)
+                if previous is not None:
+                    # Les poids de l'ancien modèle sont libérés après ses derniers lots
+                    previous["phase"] = "retired"
+                    previous["pipe"] = None
+                self.active_id = model_id
+                if self.candidate_id == model_id:
+                    self.candidate_id = None
+                    self.shadow_rate = 0.0
+            return model_id
+
+    def set_shadow_rate(self, rate):
+        with self._lock:
+            self.shadow_rate = min(max(rate, 0.0), 1.0)
+
+    # Appelé après chaque lot du modèle actif : un lot échantillonné est
+    # recopié vers le candidat sur un thread à part, sans attendre
+    def mirror(self, texts, predictions, seconds):
+        if not self.shadow_rate or self.candidate_id is None or random.random() >= self.shadow_rate:
+            return
+        with self._lock:
+            entry = self.entries.get(self.candidate_id)
+            if entry is None or entry["pipe"] is None:
+                return
+            if self._shadow_pending >= SHADOW_MAX_PENDING:
+                self.shadow.drop()
+                return
+            self._shadow_pending += 1
+        self._shadow_executor.submit(self._compare, entry, list(texts), predictions, seconds)
+
+    def _compare(self, entry, texts, primary, primary_seconds):
+        try:
+            start = time.perf_counter()
+            pool, pipe = entry["pool"], entry["pipe"]
+            if pool is not None:
+                candidate = pool.classify_texts(texts)
+            elif self._shadow_pool is None:
+                candidate = model.classify_texts(texts, pipe=pipe)
+            else:
+                # Pool shadow déjà arrêté : jamais d'inférence dans le processus principal
+                self.shadow.drop()
+                return
+            self.shadow.record(primary, candidate, primary_seconds, time.perf_counter() - start)
+        except Exception as e:
+            self.shadow.error(e)
+        finally:
+            with self._lock:
+                self._shadow_pending -= 1
+
+    def report(self):
+        with self._lock:
+            entries = {
+                model_id: {key: value for key, value in entry.items() if key not in ("pipe", "pool")}
+                for model_id, entry in self.entries.items()
+            }
+            return {
+                "active": self.active_id,
+                "candidate": self.candidate_id,
+                "shadow_rate": self.shadow_rate,
+                "shadow": self.shadow.report(),
+                "models": entries,
+            }
@@ -0,0 +1,220 @@
+import json
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import model
+import uploads
+
+# Analyse hors ligne d'un fichier complet (commande `python cli.py score`).
+# Le fichier d'entrée est lu par paquets dans un thread de préchargement,
+# les paquets sont analysés par des threads ou des processus d'inférence
+# et les résultats sont écrits par segments dans <sortie>.parts/ : après
+# un arrêt brutal, la reprise repart du dernier segment écrit.
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+# Lecture en avance de `depth` paquets, comme un DataLoader : le disque et
+# le décodage CSV/Parquet avancent pendant que le modèle calcule
+class Prefetcher:
+    _END = object()
+
+    def __init__(self, iterable, depth=4):
+        self._queue = queue.Queue(maxsize=depth)
+        self._error = None
+        self._thread = threading.Thread(target=self._fill, args=(iterable,), daemon=True, name="score-reader")
+        self._thread.start()
+
+    def _fill(self, iterable):
+        try:
+            for item in iterable:
+                self._queue.put(item)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._queue.put(self._END)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is self._END:
+                if self._error is not None:
+                    raise self._error
+                return
+            yield item
+
+
+# Paquets du fichier d'entrée, sans les `skip` premières lignes déjà analysées
+def read_batches(path, batch_size, skip=0):
+    with open(path, "rb") as file:
+        for chunk in uploads.read_chunks(file, path, batch_size):
+            if skip >= len(chunk):
+                skip -= len(chunk)
+                continue
+            if skip:
+                chunk, skip = chunk.iloc[skip:], 0
+            yield chunk.reset_index(drop=True)
+
+
+def parts_dir(output):
+    return output + ".parts"
+
+def load_checkpoint(output, input_path, column):
+    path = os.path.join(parts_dir(output), CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return {"input": os.path.abspath(input_path), "column": column, "rows_done": 0, "parts": 0}
+    with open(path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint["input"] != os.path.abspath(input_path) or checkpoint["column"] != column:
+        raise ValueError(f"{path} correspond à un autre fichier d'entrée : supprimez {parts_dir(output)}")
+    return checkpoint
+
+# Écriture atomique : un fichier à moitié écrit n'est jamais pris pour un segment terminé
+def _replace(path, write):
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+def _write_frame(frame, path, name):
+    if uploads.is_parquet(name):
+        frame.to_parquet(path, index=False)
+    elif uploads.is_jsonl(name):
+        frame.to_json(path, orient="records", lines=True, force_ascii=False)
+    else:
+        frame.to_csv(path, index=False)
+
+def part_path(output, index):
+    return os.path.join(parts_dir(output), f"part-{index:05d}{os.path.splitext(output)[1]}")
+
+def write_part(output, checkpoint, frames):
+    frame = pd.concat(frames, ignore_index=True)
+    _replace(part_path(output, checkpoint["parts"]), lambda tmp: _write_frame(frame, tmp, output))
+    checkpoint["parts"] += 1
+    checkpoint["rows_done"] += len(frame)
+
+    def write_checkpoint(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+    _replace(os.path.join(parts_dir(output), CHECKPOINT_FILE), write_checkpoint)
+
+# Réunit les segments dans le fichier de sortie puis supprime le répertoire de reprise
+def merge_parts(output, checkpoint):
+    parts = [part_path(output, i) for i in range(checkpoint["parts"])]
+    if uploads.is_parquet(output):
+        import pyarrow.parquet as pq
+        writer = None
+        for part in parts:
+            table = pq.read_table(part)
+            if writer is None:
+                writer = pq.ParquetWriter(output, table.schema)
+            # Une colonne entièrement vide dans un segment est typée null
+            writer.write_table(table.cast(writer.schema))
+        if writer is not None:
+            writer.close()
+    else:
+        # CSV : on ne garde que l'en-tête du premier segment ; un segment tient en mémoire
+        with open(output, "wb") as out:
+            for i, part in enumerate(parts):
+                with open(part, "rb") as f:
+                    if i and not uploads.is_jsonl(output):
+                        f.readline()
+                    data = f.read()
+                if data and not data.endswith(b"\n"):
+                    data += b"\n"
+                out.write(data)
+    shutil.rmtree(parts_dir(output))
+
+
+# Exécuteur d'inférence : des threads se partagent les cœurs (torch libère
+# le GIL pendant le calcul), ou des processus forkés partagent les poids.
+# Avec plusieurs threads, chacun a son propre tokenizer (voir model.pipeline_copy).
+class _Executor:
+    def __init__(self, workers, mode, threads=None):
+        self.pool = None
+        self.threads = None
+        self.workers = workers
+        self._local = threading.local()
+        if mode == "processes" and workers > 1:
+            from workers import ProcessPool
+            self.pool = ProcessPool(workers, threads)
+        else:
+            model.set_torch_threads(workers, threads)
+            self.threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="score")
+
+    def submit(self, texts):
+        if self.pool is not None:
+            return self.pool.submit(texts)
+        return self.threads.submit(self._classify, texts)
+
+    def _classify(self, texts):
+        if self.workers <= 1:
+            return model.classify_texts(texts)
+        pipe = getattr(self._local, "pipe", None)
+        if pipe is None:
+            pipe = self._local.pipe = model.pipeline_copy()
+        return model.classify_texts(texts, pipe=pipe)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+        else:
+            self.threads.shutdown()
+
+
+def score_file(input_path, output, column="text", batch_size=64, workers=1, mode="threads",
+               threads=None, prefetch=4, checkpoint_rows=10000, log=sys.stderr):
+    os.makedirs(parts_dir(output), exist_ok=True)
+    checkpoint = load_checkpoint(output, input_path, column)
+    if checkpoint["rows_done"]:
+        print(f"reprise après {checkpoint['rows_done']} lignes ({checkpoint['parts']} segments)", file=log)
+
+    # Le modèle est chargé avant le fork des processus d'inférence
+    model.load_model()
+    executor = _Executor(workers, mode, threads)
+    in_flight = deque()
+    frames = []
+    buffered = 0
+    start = time.perf_counter()
+    scored = 0
+
+    def collect():
+        nonlocal buffered, scored
+        chunk, future = in_flight.popleft()
+        frames.append(uploads.add_predictions(chunk, future.result()))
+        buffered += len(chunk)
+        scored += len(chunk)
+        if buffered >= checkpoint_rows:
+            flush()
+
+    def flush():
+        nonlocal buffered
+        write_part(output, checkpoint, frames)
+        frames.clear()
+        buffered = 0
+        rate = scored / max(time.perf_counter() - start, 1e-9)
+        print(f"{checkpoint['rows_done']} lignes analysées ({rate:.0f} lignes/s)", file=log)
+
+    try:
+        batches = Prefetcher(read_batches(input_path, batch_size, skip=checkpoint["rows_done"]), prefetch)
+        for chunk in batches:
+            in_flight.append((chunk, executor.submit(uploads.chunk_texts(chunk, column))))
+            # Deux paquets par worker en vol : aucun worker n'attend le suivant
+            if len(in_flight) >= 2 * workers:
+                collect()
+        while in_flight:
+            collect()
+        if frames:
+            flush()
+    finally:
+        executor.close()
+
+    merge_parts(output, checkpoint)
+    return {"rows": checkpoint["rows_done"], "scored_now": scored, "seconds": round(time.perf_counter() - start, 3)}
@@ -0,0 +1,66 @@
+import re
+
+# Découpage en phrases pour les langues de l'interface (fr, en, es, ar), par
+# expressions régulières : pas de modèle à charger, quelques microsecondes
+# par texte. Renvoie des positions (début, fin) dans le texte d'origine.
+
+# Fin de phrase : . ! ? … et leurs équivalents arabes (؟ ، n'en est pas un)
+TERMINATORS = ".!?…؟۔"
+_CANDIDATE = re.compile(rf"[^{TERMINATORS}]*(?:[{TERMINATORS}]+[\"'»”)\]]*|$)")
+
+# Abréviations suivies d'un point qui ne terminent pas la phrase
+ABBREVIATIONS = {
+    "fr": {"m", "mm", "mme", "mlle", "dr", "pr", "st", "ste", "etc", "ex", "cf", "env", "p", "av", "apr", "j.-c", "n°"},
+    "en": {"mr", "mrs", "ms", "dr", "prof", "st", "jr", "sr", "vs", "etc", "e.g", "i.e", "approx", "inc", "ltd"},
+    "es": {"sr", "sra", "srta", "dr", "dra", "ud", "uds", "etc", "ej", "p.ej", "pág", "núm", "aprox", "av"},
+    "ar": set(),
+}
+_ALL_ABBREVIATIONS = set().union(*ABBREVIATIONS.values())
+# Abréviations qui terminent aussi la phrase quand une majuscule suit
+SENTENCE_FINAL = {"etc"}
+_ARABIC = re.compile(r"[؀-ۿ]")
+_LAST_WORD = re.compile(r"([\w.\-°]+)\.$")
+
+
+def detect_language(text, default=None):
+    if _ARABIC.search(text):
+        return "ar"
+    return default
+
+def _continues(text, piece_end, language):
+    before = text[:piece_end].rstrip()
+    if not before.endswith("."):
+        return False
+    # Nombre décimal (3.5) : le point est suivi d'un chiffre
+    if piece_end < len(text) and text[piece_end].isdigit():
+        return True
+    match = _LAST_WORD.search(before)
+    if match is None:
+        return False
+    word = match.group(1).lower()
+    following = text[piece_end:].lstrip()[:1]
+    if word in SENTENCE_FINAL and following.isupper():
+        return False
+    abbreviations = ABBREVIATIONS.get(language, _ALL_ABBREVIATIONS)
+    # Initiale isolée (J. Dupont) ou abréviation connue
+    return (len(word) == 1 and word.isalpha()) or word in abbreviations
+
+# Positions (début, fin) des phrases, espaces exclus
+def split_sentences(text, language=None):
+    language = detect_language(text, language)
+    spans = []
+    start = None
+    for match in _CANDIDATE.finditer(text):
+        if match.start() == match.end():
+            continue
+        if start is None:
+            start = match.start()
+        if match.end() < len(text) and _continues(text, match.end(), language):
+            continue
+        end = match.end()
+        span_start = start + len(text[start:end]) - len(text[start:end].lstrip())
+        span_end = start + len(text[start:end].rstrip())
+        if span_end > span_start:
+            spans.append((span_start, span_end))
+        start = None
+    return spans
@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("uvicorn")
+pytest.importorskip("numpy")
+requests = pytest.importorskip("requests")
+
+# /predict_batch contre un vrai serveur uvicorn : TestClient ne reproduit pas
+# la lecture concurrente du corps par la détection de déconnexion de Starlette.
+# Le modèle est remplacé par une prédiction fixe, seul le transport est testé.
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    import numpy as np
+    import uvicorn
+
+    import api
+    import benchmark
+    import model
+    import policy
+
+    patched = pytest.MonkeyPatch()
+    patched.setattr(api, "prepare_model", model.mark_ready)
+    patched.setattr(
+        model, "classify_texts",
+        lambda texts, pipe=None: policy.predictions(np.tile([[0.0, 0.0, 0.1, 0.2, 0.7]], (len(texts), 1)))
+    )
+    port = benchmark.free_port()
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="error"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{url}/readyz", timeout=1).status_code == 200:
+                break
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    yield url
+    server.should_exit = True
+    thread.join(timeout=10)
+    patched.undo()
+
+
+def _post_ndjson(url, body):
+    response = requests.post(
+        f"{url}/predict_batch", data=body, headers={"Content-Type": "application/x-ndjson"}, timeout=60
+    )
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines() if line.strip()]
+
+def _lines(count):
+    return [json.dumps({"id": f"r{i}", "text": f"Texte numéro {i}"}, ensure_ascii=False) + "\n" for i in range(count)]
+
+
+def test_small_ndjson_body(server_url):
+    results = _post_ndjson(server_url, "".join(_lines(3)).encode("utf-8"))
+    assert [result["id"] for result in results] == ["r0", "r1", "r2"]
+    assert all(result["label"] == "POSITIVE" for result in results)
+
+def test_large_ndjson_body(server_url):
+    results = _post_ndjson(server_url, "".join(_lines(5000)).encode("utf-8"))
+    assert [result["index"] for result in results] == list(range(5000))
+
+def test_chunked_ndjson_body(server_url):
+    # Générateur : envoyé en Transfer-Encoding: chunked, une ligne par morceau
+    results = _post_ndjson(server_url, (line.encode("utf-8") for line in _lines(200)))
+    assert len(results) == 200
+
+def test_invalid_line_reports_error(server_url):
+    results = _post_ndjson(server_url, b'{"text": "ok"}\n{"texte": 1}\n')
+    assert "label" in results[0]
+    assert "error" in results[1]
+
+def test_json_object_body(server_url):
+    response = requests.post(f"{server_url}/predict_batch", json={"texts": ["un", "deux"]}, timeout=60)
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.text.splitlines() if line.strip()]
+    assert [result["index"] for result in results] == [0, 1]
+    assert all(result["label"] == "POSITIVE" for result in results)
+
+def test_json_list_body(server_url):
+    response = requests.post(f"{server_url}/predict_batch", json=["un", "deux", "trois"], timeout=60)
+    assert response.status_code == 200
+    assert len([line for line in response.text.splitlines() if line.strip()]) == 3
+
+def test_invalid_json_body(server_url):
+    response = requests.post(f"{server_url}/predict_batch", json={"textes": []}, timeout=60)
+    assert response.status_code == 422
+
+def test_http_client_predict_many(server_url):
+    from client import HttpClient
+    predictions = HttpClient(server_url).predict_many([f"texte {i}" for i in range(50)])
+    assert len(predictions) == 50
+    assert all(prediction["label"] == "POSITIVE" for prediction in predictions)
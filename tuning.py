@@ -0,0 +1,56 @@
+import json
+import os
+
+# Profil de réglages écrit par `python cli.py autotune` : les valeurs mesurées
+# comme les meilleures sur cette machine. Il est appliqué au démarrage, avant
+# la lecture des variables d'environnement par model.py et api.py ; une
+# variable déjà définie dans l'environnement reste prioritaire.
+TUNING_PROFILE = os.environ.get("TUNING_PROFILE", "tuning_profile.json")
+# Réglages qu'un profil peut fixer
+TUNED_SETTINGS = (
+    "INFERENCE_THREADS",
+    "INFERENCE_INTEROP_THREADS",
+    "INFERENCE_FAST_PATH",
+    "INFERENCE_GRAD_MODE",
+    "BATCH_MAX_SIZE",
+    "BATCH_CHUNK_SIZE",
+    "BATCH_MAX_WAIT_MS",
+)
+
+# Réglages repris du profil chargé (GET /inference/stats)
+applied = {}
+_loaded = False
+
+
+# Une seule lecture par processus, quel que soit le module importé en premier
+def load_profile(path=None):
+    global _loaded
+    if _loaded:
+        return applied
+    _loaded = True
+    path = TUNING_PROFILE if path is None else path
+    if not path or not os.path.exists(path):
+        return applied
+    with open(path, encoding="utf-8") as f:
+        profile = json.load(f)
+    cpu_count = profile.get("environment", {}).get("cpu_count")
+    if cpu_count and cpu_count != os.cpu_count():
+        print(f"Profil {path} mesuré sur {cpu_count} cœurs (ici {os.cpu_count()}) : relancer python cli.py autotune")
+    for name, value in profile.get("settings", {}).items():
+        if name in TUNED_SETTINGS and name not in os.environ:
+            os.environ[name] = str(value)
+            applied[name] = str(value)
+    print(f"Profil de réglages {path} : {', '.join(f'{k}={v}' for k, v in applied.items()) or 'rien à appliquer'}")
+    return applied
+
+def write_profile(path, settings, environment, measurements):
+    profile = {
+        "environment": environment,
+        "settings": {name: str(settings[name]) for name in TUNED_SETTINGS if name in settings},
+        "measurements": measurements,
+    }
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    return profile
@@ -0,0 +1,62 @@
+import os
+
+import pandas as pd
+
+# Lignes lues et analysées à chaque étape de l'analyse de fichier
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", "256"))
+
+
+def is_parquet(name):
+    return name.lower().endswith((".parquet", ".pq"))
+
+def is_jsonl(name):
+    return name.lower().endswith((".jsonl", ".ndjson"))
+
+def list_columns(file, name):
+    file.seek(0)
+    if is_parquet(name):
+        import pyarrow.parquet as pq
+        return list(pq.ParquetFile(file).schema_arrow.names)
+    columns = list(pd.read_csv(file, nrows=0).columns)
+    file.seek(0)
+    return columns
+
+# Nombre de lignes : exact pour Parquet (métadonnées), estimé pour CSV
+def count_rows(file, name):
+    file.seek(0)
+    if is_parquet(name):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(file).metadata.num_rows
+    rows = 0
+    for block in iter(lambda: file.read(1 << 20), b""):
+        rows += block.count(b"\n")
+    file.seek(0)
+    return max(rows - 1, 0)
+
+# Découpe le fichier en DataFrames de chunk_size lignes sans le charger en entier
+def read_chunks(file, name, chunk_size=UPLOAD_CHUNK_SIZE):
+    file.seek(0)
+    if is_parquet(name):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(file).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif is_jsonl(name):
+        yield from pd.read_json(file, lines=True, chunksize=chunk_size)
+    else:
+        yield from pd.read_csv(file, chunksize=chunk_size)
+
+def chunk_texts(chunk, column):
+    return chunk[column].fillna("").astype(str).tolist()
+
+# Colonnes ajoutées au fichier téléchargé
+def add_predictions(chunk, predictions):
+    chunk = chunk.copy()
+    chunk["sentiment"] = [prediction["label"] for prediction in predictions]
+    chunk["score"] = [prediction["score"] for prediction in predictions]
+    chunk["stars"] = [prediction.get("stars") for prediction in predictions]
+    # Probabilités des 5 étoiles : le fichier peut être réétiqueté sans réanalyse
+    for star in range(1, 6):
+        chunk[f"prob_{star}_star"] = [
+            prediction["probs"][star - 1] if prediction.get("probs") else None for prediction in predictions
+        ]
+    return chunk
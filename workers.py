@@ -0,0 +1,318 @@
+import collections
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import connection as mp_connection
+
+import bucketing
+import metrics
+import model
+
+HEARTBEAT_INTERVAL = 1.0
+# Un worker inactif dont le battement de cœur date de plus de ce délai est
+# figé : il est tué puis remplacé
+WORKER_HEARTBEAT_TIMEOUT = 5 * HEARTBEAT_INTERVAL
+# Même chose pendant le calcul d'un lot, en secondes depuis son début
+WORKER_JOB_TIMEOUT = float(os.environ.get("WORKER_JOB_TIMEOUT", "60"))
+# Remplacements de workers morts tolérés par minute, au-delà le pool se vide
+WORKER_MAX_RESTARTS = int(os.environ.get("WORKER_MAX_RESTARTS", "5"))
+
+
+class WorkerDiedError(Exception):
+    pass
+
+
+# Compteurs accumulés dans le worker depuis le dernier lot
+def _drain_stats():
+    return {
+        "padding": bucketing.padding_stats.drain(),
+        "stages": metrics.STAGE_LATENCY.drain(),
+        "token_cache": model.token_cache.drain(),
+    }
+
+# Le fork ne copie que le thread appelant : un verrou tenu à cet instant par
+# un autre thread du parent (collecteur, boucle du serveur) resterait pris pour
+# toujours dans le worker. Les compteurs hérités du parent sont aussi oubliés,
+# sans quoi le premier drain() les lui renverrait.
+def _reset_after_fork():
+    bucketing.padding_stats.reset_after_fork()
+    metrics.STAGE_LATENCY.reset_after_fork()
+    model.token_cache.reset_after_fork()
+
+def _worker_main(index, processes, threads, interop_threads, pipe, tasks, results, heartbeats, current_jobs, processed):
+    _reset_after_fork()
+    # Les poids ont été chargés avant le fork : ce processus les partage
+    # en copie sur écriture avec le parent et les autres workers
+    model.set_torch_threads(processes, threads, interop_threads)
+    heartbeats[index] = time.time()
+    while True:
+        try:
+            task = tasks.get(timeout=HEARTBEAT_INTERVAL)
+        except queue.Empty:
+            heartbeats[index] = time.time()
+            continue
+        if task is None:
+            break
+        job_id, texts = task
+        heartbeats[index] = time.time()
+        current_jobs[index] = job_id
+        try:
+            payload = (job_id, model.classify_texts(texts, pipe=pipe), None, _drain_stats())
+        except Exception as e:
+            payload = (job_id, None, repr(e), _drain_stats())
+        processed[index] += len(texts)
+        current_jobs[index] = -1
+        heartbeats[index] = time.time()
+        results.send(payload)
+    results.close()
+
+
+# Un worker vu du processus principal : sa file de lots, son canal de
+# résultats et les lots qui lui ont été confiés, dans l'ordre d'envoi
+class _Worker:
+    def __init__(self, index, proc, tasks, results):
+        self.index = index
+        self.proc = proc
+        self.tasks = tasks
+        self.results = results
+        self.jobs = collections.deque()
+        self.stalled = False
+
+
+# Pool de processus d'inférence. Le modèle doit être chargé avant la création
+# du pool : les workers sont créés par fork et ne rechargent pas les poids.
+# Chaque worker a sa propre file de lots et son propre canal de résultats :
+# un worker tué ne bloque pas les autres sur un verrou de file partagée, et
+# le parent sait à tout moment quels lots il détient. Un worker mort fait
+# échouer le lot en cours (le plus ancien qu'il détient), ses autres lots sont
+# renvoyés aux workers vivants et il est remplacé par un nouveau fork (au plus
+# WORKER_MAX_RESTARTS fois par minute). Un worker figé (battement de cœur trop
+# ancien) est tué et traité de la même façon. Sans worker vivant, tous les lots en
+# attente échouent et submit() lève WorkerDiedError.
+# `pipe` : modèle servi par les workers (par défaut model.classifier), par
+# exemple un candidat évalué en shadow (voir registry.py).
+class ProcessPool:
+    def __init__(self, processes, threads=None, interop_threads=None, pipe=None):
+        self._context = mp.get_context("fork")
+        self.processes = processes
+        self._threads = threads
+        self._interop_threads = interop_threads
+        self._pipe = pipe
+        self._heartbeats = self._context.Array("d", processes, lock=False)
+        self._current_jobs = self._context.Array("q", [-1] * processes, lock=False)
+        self._processed = self._context.Array("q", processes, lock=False)
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._closed = False
+        self.restarts = 0
+        # Cause du dernier arrêt de worker (GET /workers)
+        self.last_failure = None
+        self._restart_times = collections.deque()
+        # Réveil du thread collecteur à la fermeture du pool
+        self._wakeup_reader, self._wakeup_writer = self._context.Pipe(duplex=False)
+        self._workers = [self._start_worker(i) for i in range(processes)]
+        self._collector = threading.Thread(target=self._collect, daemon=True, name="inference-results")
+        self._collector.start()
+
+    def _start_worker(self, index):
+        tasks = self._context.Queue()
+        reader, writer = self._context.Pipe(duplex=False)
+        self._heartbeats[index] = time.time()
+        self._current_jobs[index] = -1
+        proc = self._context.Process(
+            target=_worker_main,
+            args=(index, self.processes, self._threads, self._interop_threads, self._pipe, tasks, writer,
+                  self._heartbeats, self._current_jobs, self._processed),
+            name=f"inference-worker-{index}",
+            daemon=True
+        )
+        proc.start()
+        writer.close()
+        return _Worker(index, proc, tasks, reader)
+
+    @property
+    def alive(self):
+        return sum(1 for worker in self._workers if worker is not None and worker.proc.is_alive())
+
+    # Lot confié au worker `worker`, sinon au worker vivant le moins chargé
+    def submit(self, texts, worker=None):
+        future = Future()
+        texts = list(texts)
+        with self._lock:
+            if self._closed:
+                raise WorkerDiedError("Pool d'inférence arrêté")
+            target = self._workers[worker] if worker is not None else self._least_busy()
+            if target is None:
+                raise WorkerDiedError("Aucun worker d'inférence en vie")
+            job_id = next(self._ids)
+            self._futures[job_id] = (future, texts)
+            self._dispatch(target, job_id, texts)
+        return future
+
+    # Un lot par worker, pour préchauffer chacun d'eux
+    def submit_each(self, texts):
+        return [self.submit(texts, worker=index) for index, worker in enumerate(self._workers) if worker is not None]
+
+    def classify_texts(self, texts):
+        return self.submit(texts).result()
+
+    def _least_busy(self):
+        workers = [worker for worker in self._workers if worker is not None]
+        return min(workers, key=lambda worker: len(worker.jobs)) if workers else None
+
+    def _dispatch(self, worker, job_id, texts):
+        worker.jobs.append(job_id)
+        worker.tasks.put((job_id, texts))
+
+    def _collect(self):
+        while True:
+            with self._lock:
+                workers = [worker for worker in self._workers if worker is not None]
+            channels = {worker.results: worker for worker in workers}
+            sentinels = {worker.proc.sentinel: worker for worker in workers}
+            ready = mp_connection.wait(
+                [self._wakeup_reader, *channels, *sentinels], timeout=HEARTBEAT_INTERVAL
+            )
+            for handle in ready:
+                if handle in channels:
+                    self._receive(channels[handle])
+            for handle in ready:
+                if handle in sentinels:
+                    self._worker_died(sentinels[handle])
+            if self._wakeup_reader in ready:
+                return
+            self._kill_stalled(workers)
+
+    # Worker figé (verrou jamais relâché, calcul bloqué) : tué, sa mort est
+    # ensuite traitée via sa sentinelle comme celle des autres
+    def _kill_stalled(self, workers):
+        now = time.time()
+        for worker in workers:
+            timeout = WORKER_JOB_TIMEOUT if self._current_jobs[worker.index] >= 0 else WORKER_HEARTBEAT_TIMEOUT
+            if not worker.stalled and worker.proc.is_alive() and now - self._heartbeats[worker.index] > timeout:
+                worker.stalled = True
+                worker.proc.kill()
+
+    def _receive(self, worker):
+        try:
+            while worker.results.poll():
+                job_id, predictions, error, stats = worker.results.recv()
+                self._complete(worker, job_id, predictions, error, stats)
+        except (EOFError, OSError):
+            # Canal fermé : la mort du worker est traitée via sa sentinelle
+            pass
+
+    def _complete(self, worker, job_id, predictions, error, stats):
+        # Compteurs du worker, agrégés dans le processus principal
+        bucketing.padding_stats.merge(stats["padding"])
+        metrics.STAGE_LATENCY.merge(stats["stages"])
+        model.token_cache.merge(stats["token_cache"])
+        with self._lock:
+            if job_id in worker.jobs:
+                worker.jobs.remove(job_id)
+            entry = self._futures.pop(job_id, None)
+        if entry is None:
+            return
+        if error is None:
+            entry[0].set_result(predictions)
+        else:
+            entry[0].set_exception(RuntimeError(error))
+
+    def _may_restart(self):
+        now = time.monotonic()
+        while self._restart_times and now - self._restart_times[0] > 60:
+            self._restart_times.popleft()
+        return len(self._restart_times) < WORKER_MAX_RESTARTS
+
+    def _worker_died(self, worker):
+        # Résultats envoyés juste avant la mort
+        self._receive(worker)
+        worker.proc.join(timeout=1)
+        failed = []
+        with self._lock:
+            if self._workers[worker.index] is not worker:
+                return
+            lost = list(worker.jobs)
+            worker.jobs.clear()
+            self._current_jobs[worker.index] = -1
+            worker.tasks.cancel_join_thread()
+            worker.tasks.close()
+            replacement = None
+            if not self._closed and self._may_restart():
+                self._restart_times.append(time.monotonic())
+                self.restarts += 1
+                replacement = self._start_worker(worker.index)
+            self._workers[worker.index] = replacement
+            if worker.stalled:
+                reason = f"{worker.proc.name} (pid {worker.proc.pid}) ne répondait plus et a été tué"
+            else:
+                reason = f"{worker.proc.name} (pid {worker.proc.pid}, code {worker.proc.exitcode}) s'est arrêté"
+            self.last_failure = {"reason": reason, "at": time.time(), "replaced": replacement is not None}
+            # Le plus ancien lot est celui en cours de calcul : il a pu causer
+            # la mort du worker, il n'est pas rejoué
+            if lost:
+                failed.append(self._futures.pop(lost[0], None))
+            for job_id in lost[1:]:
+                target = self._least_busy()
+                if target is None:
+                    failed.append(self._futures.pop(job_id, None))
+                else:
+                    self._dispatch(target, job_id, self._futures[job_id][1])
+            if self._least_busy() is None:
+                failed.extend(self._futures.values())
+                self._futures.clear()
+        for entry in failed:
+            if entry is not None and not entry[0].done():
+                entry[0].set_exception(WorkerDiedError(reason))
+
+    def health(self):
+        now = time.time()
+        workers = []
+        for index, worker in enumerate(self._workers):
+            proc = worker.proc if worker is not None else None
+            workers.append({
+                "name": f"inference-worker-{index}",
+                "pid": proc.pid if proc else None,
+                "alive": bool(proc and proc.is_alive()),
+                "exitcode": proc.exitcode if proc else None,
+                "busy": self._current_jobs[index] >= 0,
+                "queued": len(worker.jobs) if worker is not None else 0,
+                "last_heartbeat_s": round(now - self._heartbeats[index], 3),
+                "processed": self._processed[index],
+            })
+        return workers
+
+    # Pool remplacé par un autre (changement de modèle) : on laisse aux
+    # appelants qui l'ont déjà choisi le temps de soumettre, on attend ses
+    # derniers lots puis on l'arrête
+    def retire(self, grace=1.0, timeout=60.0):
+        time.sleep(grace)
+        deadline = time.time() + timeout
+        while self._futures and time.time() < deadline:
+            time.sleep(0.1)
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            workers = [worker for worker in self._workers if worker is not None]
+        for worker in workers:
+            worker.tasks.put(None)
+        for worker in workers:
+            worker.proc.join(timeout=5)
+        # Sentinelle : le collecteur lit les derniers résultats puis s'arrête
+        self._wakeup_writer.send(None)
+        self._collector.join(timeout=5)
+        with self._lock:
+            remaining = list(self._futures.values())
+            self._futures.clear()
+        for future, _ in remaining:
+            if not future.done():
+                future.set_exception(WorkerDiedError("Pool d'inférence arrêté"))